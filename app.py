@@ -4,64 +4,145 @@ Dashboard móvil para Fundación AIP - Versión optimizada para dispositivos mó
 """
 
 import pandas as pd
+import numpy as np
 import plotly.express as px
-from dash import Dash, dcc, html, Input, Output, State, callback_context, ALL
-import geopandas as gpd
+import plotly.graph_objects as go
+from plotly.utils import PlotlyJSONEncoder
+from dash import Dash, dcc, html, Input, Output, State, callback_context, ALL, Patch, ClientsideFunction
 from datetime import datetime
 import json
 import dash
 import os
 from dash.exceptions import PreventUpdate
-import base64
+import flask
+from geometria import CapaGeometrias, limites_teselas, nivel_para_zoom, teselas_ventana, ventana_mapa
+from filtros import CuboKPIs, IndiceProyectos, MotorFiltros
+from cache import CacheLRU, AlmacenDisco
+from fotos import PipelineFotos, rendiciones_altura
+from datos import cargar_geometrias, cargar_proyectos, proyectos_path
+from recarga import RecargaDatos
+from metricas import Metricas
+from respuestas import CompresionRespuestas, instalar_cache_assets, url_asset
+from nomenclator import Nomenclator
+from compartido import GeometriasWKB, compactar_columnas
+from espacial import IndiceEspacial
+from fondo import CuposProceso, crear_gestor
+from coalescencia import ColaLlena, ColaPorSesion, Reemplazada
+import hashlib
+import secrets
+import logging
+from types import SimpleNamespace
+from collections import OrderedDict
 
 # 1. Configuración inicial móvil
 app = Dash(__name__, title="Dashboard Móvil Fundación AIP", suppress_callback_exceptions=True, meta_tags=[
     {'name': 'viewport', 'content': 'width=device-width, initial-scale=1.0, maximum-scale=1.2, minimum-scale=0.5'}
 ])
 server = app.server
+logger = logging.getLogger(__name__)
 
-# Carga de datos
-shapefile_path = "data/shapefiles/municipio_distrito_y_area_no_municipalizada.shp"
-municipios_gdf = gpd.read_file(shapefile_path)
+# Carga de datos (artefactos procesados en data/cache/artefactos, reconstruidos si cambian las fuentes)
+municipios_gdf, aip_locations_gdf = cargar_geometrias()
 
-aip_locations_path = "data/shapefiles/cobertura_trabajo_aip.shp"
-aip_locations_gdf = gpd.read_file(aip_locations_path)
+# Rendiciones de la evidencia fotográfica (miniatura y pantalla), generadas una vez.
+# Las URLs llevan el prefijo de despliegue (requests_pathname_prefix), como las de Dash
+pipeline_fotos = PipelineFotos(
+    os.environ.get('AIP_FOTOS', "assets/fotos"),
+    os.path.abspath("data/cache/fotos"),
+    url_base=app.get_relative_path('/fotos/')
+)
+pipeline_fotos.procesar()
+
+# Nomenclátor: índice (municipio, departamento) -> fila de municipios_gdf
+nomenclator = Nomenclator(municipios_gdf)
 
-# Codificar imágenes
-def encode_image(image_path):
-    if os.path.exists(image_path):
-        with open(image_path, "rb") as image_file:
-            return f"data:image/jpeg;base64,{base64.b64encode(image_file.read()).decode('utf-8')}"
-    return None
+# Geometrías simplificadas y cuantizadas una sola vez al arranque
+capa_geometrias = CapaGeometrias(municipios_gdf, columna_codigo='codigo')
 
-logo_encoded = encode_image("assets/logo.png")
-huella_encoded = encode_image("assets/Figura_huella_aip.png")
+# Con la capa y el nomenclátor construidos, las geometrías completas pasan a un buffer WKB
+# (un solo bloque de memoria que los workers comparten con preload_app)
+geometrias_wkb = GeometriasWKB(municipios_gdf.geometry)
+municipios_gdf = pd.DataFrame(municipios_gdf.drop(columns='geometry'))
 
-# Procesamiento de datos geoespaciales
-if municipios_gdf.crs != "EPSG:4326":
-    municipios_gdf = municipios_gdf.to_crs("EPSG:4326")
-if aip_locations_gdf.crs != "EPSG:4326":
-    aip_locations_gdf = aip_locations_gdf.to_crs("EPSG:4326")
+# Coordenadas de la capa "Cobertura AIP" precalculadas como arreglos
+aip_lat = aip_locations_gdf.geometry.y.to_numpy()
+aip_lon = aip_locations_gdf.geometry.x.to_numpy()
+aip_customdata = aip_locations_gdf[["Municipio", "Departamen"]].to_numpy()
 
-municipios_gdf_projected = municipios_gdf.to_crs("EPSG:3116")
-municipios_gdf_projected['centroid'] = municipios_gdf_projected.geometry.centroid
-municipios_gdf['lon'] = municipios_gdf_projected.centroid.map(lambda p: p.x)
-municipios_gdf['lat'] = municipios_gdf_projected.centroid.map(lambda p: p.y)
+# Índice espacial de los municipios: clics en el mapa y puntos de cobertura -> fila del shapefile
+indice_espacial = IndiceEspacial(geometrias_wkb, nomenclator)
+posicion_codigo = {codigo: i for i, codigo in enumerate(nomenclator.codigos)}
+aip_posiciones = indice_espacial.asignar(aip_lon, aip_lat)
+for i in np.flatnonzero(aip_posiciones < 0):
+    logger.warning("Punto de cobertura AIP fuera de todo municipio: %s (%s)", *aip_customdata[i])
 
 def cargar_base_datos():
-    df = pd.read_excel("data/proyectos.xlsx")
-    df['Fecha inicio'] = pd.to_datetime(df['Fecha inicio'])
-    df['Fecha fin'] = pd.to_datetime(df['Fecha fin'])
-    df['Beneficiarios totales'] = df['Beneficiarios directos'] + df['Beneficiarios indirectos']
+    df, filas_invalidas = cargar_proyectos()
+    for _, fila in filas_invalidas.iterrows():
+        logger.warning(
+            "Fila %s (ID %s) de proyectos, columna '%s': %s (%r)%s",
+            fila['fila'], fila['ID'], fila['columna'], fila['motivo'], fila['valor'],
+            "; fila descartada" if fila['descartada'] else ""
+        )
     
-    df['Municipio'] = df['Municipio'].str.upper().str.strip()
-    df['Departamento'] = df['Departamento'].str.upper().str.strip()
-    municipios_gdf['MpNombre'] = municipios_gdf['MpNombre'].str.upper().str.strip()
-    municipios_gdf['Depto'] = municipios_gdf['Depto'].str.upper().str.strip()
+    # Unión proyecto -> fila de municipios_gdf, calculada una vez por carga (-1 si no hay match)
+    df['pos_municipio'] = nomenclator.posiciones(df['Municipio'], df['Departamento'])
+    sin_municipio = nomenclator.reporte_sin_emparejar(df, df['pos_municipio'].to_numpy())
+    for _, fila in sin_municipio.iterrows():
+        logger.warning(
+            "Proyecto %s sin municipio en el shapefile: %s (%s); ¿quiso decir %s?",
+            fila['ID'], fila['Municipio'], fila['Departamento'], fila['Sugerencia']
+        )
     
-    return df
+    # Texto repetitivo como categorías: menos objetos Python por worker
+    df = compactar_columnas(df)
+    
+    # Índices de filtrado construidos una sola vez por carga
+    motor_filtros = MotorFiltros(df)
+    
+    return df, motor_filtros, sin_municipio, filas_invalidas
+
+# Modo del mapa: 'agregado' (un polígono por municipio) o 'proyectos' (uno por proyecto)
+modo_mapa = os.environ.get('AIP_MODO_MAPA', 'agregado')
 
-df = cargar_base_datos()
+# Rango del slider de costos (millones $COP)
+rango_costos = (0, 7000)
+
+# Cache de resultados de update_data; las claves incluyen la versión de los datos
+cache_resultados = CacheLRU(
+    max_entradas=int(os.environ.get('AIP_CACHE_MAX_ENTRADAS', 128)),
+    max_bytes=int(os.environ.get('AIP_CACHE_MAX_MB', 64)) * 1024 * 1024
+)
+
+# Almacén de resultados en el servidor: el navegador solo guarda los filtros
+if os.environ.get('AIP_ALMACEN_RESULTADOS', 'memoria') == 'disco':
+    almacen_resultados = AlmacenDisco(os.environ.get('AIP_ALMACEN_DIR', '/tmp/aip-resultados'))
+else:
+    almacen_resultados = CacheLRU(max_entradas=1024)
+
+# Latencia por callback y etapa, tamaño de respuestas y aciertos de cache (ruta /metrics);
+# con AIP_METRICAS_LOG=1 además se escribe una línea JSON por petición de callback
+metricas = Metricas(log_estructurado=os.environ.get('AIP_METRICAS_LOG') == '1')
+metricas.registrar_cache('resultados', cache_resultados)
+metricas.registrar_cache('almacen', almacen_resultados)
+metricas.instalar(server)
+
+# Compresión gzip/brotli de callbacks, layout y GeoJSON (registrada después de las métricas:
+# Flask ejecuta los after_request en orden inverso, así las métricas ven los bytes comprimidos)
+if os.environ.get('AIP_COMPRESION', '1') == '1':
+    CompresionRespuestas(
+        umbral=int(os.environ.get('AIP_COMPRESION_MIN_BYTES', 1024)),
+        nivel_gzip=int(os.environ.get('AIP_COMPRESION_NIVEL', 6)),
+        nivel_brotli=int(os.environ.get('AIP_COMPRESION_NIVEL_BROTLI', 5))
+    ).instalar(server)
+instalar_cache_assets(server, app.config.requests_pathname_prefix + 'assets/')
+
+# Cómputo de filtros (fallos de cache de update_data) en una cola acotada: de cada pestaña
+# solo se calcula la última petición y las pestañas se atienden en orden de llegada
+cola_filtros = ColaPorSesion(
+    concurrencia=int(os.environ.get('AIP_FILTROS_CONCURRENCIA', 1)),
+    max_espera=int(os.environ.get('AIP_FILTROS_MAX_ESPERA', 8))
+)
 
 # 2. Esquema de colores optimizado para móvil
 colors = {
@@ -135,12 +216,23 @@ styles = {
         'border': f'1px solid {colors["gold"]}'  # Borde dorado
     },
     'map-container': {
+        'position': 'relative',
         'height': '400px',
         'marginBottom': '10px',
         'boxShadow': '0 2px 6px rgba(0,0,0,0.1)',
         'borderRadius': '8px',
         'border': f'1px solid {colors["gold"]}'  # Borde dorado
     },
+    'mapa-progreso': {
+        'position': 'absolute',
+        'top': '10px',
+        'left': '10px',
+        'padding': '4px 10px',
+        'borderRadius': '4px',
+        'backgroundColor': 'rgba(255,255,255,0.9)',
+        'fontSize': '12px',
+        'zIndex': 10
+    },
     'municipios-list': {
         'height': '300px',
         'overflowY': 'auto',
@@ -309,6 +401,24 @@ styles = {
         'margin': '4px',
         'boxShadow': '0 2px 3px rgba(0,0,0,0.2)'
     },
+    'mas-municipios': {
+        'display': 'block',
+        'width': '100%',
+        'padding': '8px',
+        'borderRadius': '6px',
+        'backgroundColor': colors['gold'],
+        'color': '#333',
+        'fontWeight': '600',
+        'border': 'none',
+        'cursor': 'pointer',
+        'fontSize': '12px'
+    },
+    'photo-thumb': {
+        'display': 'block',
+        'height': '48px',
+        'margin': '0 auto 4px',
+        'borderRadius': '4px'
+    },
     'modal': {
         'position': 'fixed',
         'top': '0',
@@ -350,344 +460,875 @@ styles = {
     }
 }
 
+# Logo y huella: WebP (con PNG de respaldo) a su altura en pantalla, en 1x, 2x y 3x, con
+# nombres por hash de contenido servidos por /fotos. Sin Pillow, el PNG original con huella en la URL
+def imagen_encabezado(nombre, estilo, alt):
+    origen = os.path.join(app.config.assets_folder, nombre)
+    if not os.path.exists(origen):
+        return None
+    variantes = rendiciones_altura(origen, pipeline_fotos.directorio_destino, int(estilo['height'].rstrip('px')))
+    if variantes is None:
+        return html.Img(src=url_asset(app, nombre), style=estilo, alt=alt)
+    
+    def srcset(formato):
+        return ', '.join(f"{pipeline_fotos.url_base}{archivo} {escala}x" for archivo, escala in variantes[formato])
+    
+    return html.Picture([
+        html.Source(srcSet=srcset('webp'), type='image/webp'),
+        html.Img(
+            src=pipeline_fotos.url_base + variantes['png'][0][0],
+            srcSet=srcset('png'),
+            width=variantes['ancho'],
+            height=variantes['alto'],
+            alt=alt,
+            style=estilo
+        )
+    ])
+
+imagen_logo = imagen_encabezado("logo.png", styles['logo'], "Fundación AIP")
+imagen_huella = imagen_encabezado("Figura_huella_aip.png", styles['huella-img'], "Huella AIP")
+
+# Tarjetas de municipios: las dibuja assets/tarjetas_municipios.js por páginas
+config_tarjetas = {
+    'pagina': int(os.environ.get('AIP_MUNICIPIOS_POR_PAGINA', 50)),
+    'estilos': {
+        **{nombre: styles[nombre] for nombre in [
+            'municipio-card', 'municipio-card-selected', 'municipio-name',
+            'municipio-name-selected', 'municipio-projects', 'municipio-projects-selected',
+            'mas-municipios'
+        ]},
+        'sin-municipios': {'textAlign': 'center', 'color': 'white', 'padding': '10px'},
+        'oculto': {'display': 'none'}
+    }
+}
+
+# Figura base del mapa: trazas, estilo y layout fijos, construidos una vez.
+# Los callbacks solo envían Patch con ubicaciones y datos de hover por traza.
+paleta_tipos = px.colors.qualitative.Plotly
+
+# GeoJSON servido por URL con hash de contenido: el navegador lo descarga una vez y lo cachea.
+# Se guardan los de las últimas cargas, como `codigos_por_firma` (cada uno es un GeoJSON completo)
+MAX_FIRMAS_GEO = 4
+geojson_publicado = OrderedDict()
+def publicar_geojson(nivel, codigos):
+    contenido = capa_geometrias.geojson_bytes(nivel, codigos)
+    nombre = f"{nivel}-{hashlib.sha1(contenido).hexdigest()[:12]}.geojson"
+    geojson_publicado[nombre] = contenido
+    geojson_publicado.move_to_end(nombre)
+    while len(geojson_publicado) > MAX_FIRMAS_GEO:
+        geojson_publicado.popitem(last=False)
+    return app.get_relative_path(f"/geo/{nombre}")
+
+# Al acercar el mapa, GeoJSON del nivel de detalle del zoom solo con los municipios de la
+# ventana (ajustada a teselas). La URL lleva todo lo necesario para regenerarlo en cualquier
+# worker: firma del conjunto de municipios, nivel y rango de teselas
+geojson_vistas = CacheLRU(max_entradas=256, max_bytes=32 * 1024 * 1024)
+# Municipios de las últimas firmas: una página renderizada antes de una recarga (o por un
+# worker que aún no recargó) sigue pidiendo URLs con su firma
+codigos_por_firma = OrderedDict()
+
+def registrar_firma_geo(codigos_mapa):
+    firma = hashlib.sha1('\n'.join(map(str, codigos_mapa)).encode('utf-8')).hexdigest()[:12]
+    codigos_por_firma[firma] = codigos_mapa
+    codigos_por_firma.move_to_end(firma)
+    while len(codigos_por_firma) > MAX_FIRMAS_GEO:
+        codigos_por_firma.popitem(last=False)
+    return firma
+
+def con_datos_vigentes(buscar):
+    """`buscar()`; si no encuentra nada, revisa antes si hay datos nuevos que este worker no cargó.
+
+    Cada worker vigila el archivo por su cuenta: la página puede venir de otro que ya recargó.
+    """
+    encontrado = buscar()
+    if encontrado is None:
+        try:
+            if recarga_datos.verificar():
+                encontrado = buscar()
+        except Exception:
+            logger.exception("No se pudo verificar %s", proyectos_path)
+    return encontrado
+
+def geojson_vista(firma, codigos_mapa, nivel, z, x0, y0, x1, y1):
+    clave = (firma, nivel, z, x0, y0, x1, y1)
+    contenido = geojson_vistas.obtener(clave)
+    if contenido is None:
+        posiciones = indice_espacial.en_caja(*limites_teselas(z, x0, y0, x1, y1))
+        codigos = np.intersect1d(nomenclator.codigos[posiciones], codigos_mapa)
+        contenido = capa_geometrias.geojson_bytes(nivel, codigos.tolist())
+        geojson_vistas.guardar(clave, contenido, len(contenido))
+    return contenido
+
+def url_geojson_zoom(datos, relayout):
+    """URL del GeoJSON para la vista del relayoutData (None si no trae zoom)."""
+    ventana = ventana_mapa(relayout)
+    if ventana is None or 'mapbox.zoom' not in relayout:
+        return None
+    nivel = nivel_para_zoom(relayout['mapbox.zoom'])
+    if nivel == 'nacional':
+        # Vista de país: la capa simplificada completa de la figura base
+        return datos.url_geojson
+    z, x0, y0, x1, y1 = teselas_ventana(*ventana, relayout['mapbox.zoom'])
+    return app.get_relative_path(f"/geo/vista/{datos.firma_geo}/{nivel}/{z}/{x0}/{y0}/{x1}/{y1}.geojson")
+
+if modo_mapa == 'agregado':
+    columnas_hover = ['MpNombre', 'Depto', 'Tipo de proyecto', 'Proyectos', 'Inversion', 'Beneficiarios', 'Area']
+    hovertemplate_mapa = (
+        "<b>%{customdata[0]}</b><br>Depto: %{customdata[1]}<br>Proyectos: %{customdata[3]}"
+        "<br>Tipo principal: %{customdata[2]}<br>Inversión: $%{customdata[4]:,.0f}M"
+        "<br>Beneficiarios: %{customdata[5]:,}<br>Área: %{customdata[6]:,.1f} ha"
+    )
+else:
+    columnas_hover = ['MpNombre', 'Depto', 'Tipo de proyecto', 'ID']
+    hovertemplate_mapa = "<b>%{customdata[0]}</b><br>Depto: %{customdata[1]}<br>Proyecto: %{customdata[2]}"
+
+def construir_figura_base(tipos_mapa, url_geojson):
+    fig = go.Figure()
+    for i, tipo in enumerate(tipos_mapa):
+        color = paleta_tipos[i % len(paleta_tipos)]
+        fig.add_trace(go.Choroplethmapbox(
+            geojson=url_geojson,
+            locations=[],
+            z=[],
+            colorscale=[[0, color], [1, color]],
+            showscale=False,
+            marker={'opacity': 0.7},
+            name=tipo,
+            legendgroup=tipo,
+            showlegend=False,
+            hovertemplate=hovertemplate_mapa
+        ))
+    
+    fig.add_trace(
+        px.scatter_mapbox(
+            lat=aip_lat,
+            lon=aip_lon,
+            color_discrete_sequence=[colors['aip-locations']]
+        ).update_traces(
+            marker=dict(size=8),
+            name="Cobertura AIP",
+            hovertemplate="<b>%{customdata[0]}</b><br>%{customdata[1]}<extra></extra>",
+            customdata=aip_customdata
+        ).data[0]
+    )
+    
+    fig.update_layout(
+        mapbox_style="carto-positron",
+        mapbox_center={"lat": 4.6, "lon": -74.1},
+        mapbox_zoom=4.5,
+        # Conserva el zoom del usuario cuando los callbacks actualizan la figura
+        uirevision='mapa',
+        margin={"r":0,"t":0,"l":0,"b":0},
+        legend=dict(title_text="Tipo de proyecto", orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        annotations=[]
+    )
+    return fig
+
+# Filtrado en el navegador (assets/filtrado_cliente.js) si la tabla de proyectos es pequeña:
+# se envía una vez en formato columnar y los sliders no vuelven a llamar al servidor
+umbral_cliente = int(os.environ.get('AIP_UMBRAL_CLIENTE', 5000))
+
+def columna_cliente(df, columna):
+    """Valores numéricos como lista JSON (NaN -> None)."""
+    serie = df[columna].astype(float)
+    return serie.where(serie.notna(), None).tolist()
+
+def construir_tabla_cliente(df, tipos_mapa):
+    """Tabla columnar compacta: números y códigos de categoría, sin repetir textos por fila."""
+    categorias = {}
+    codigos = {}
+    for clave, columna in [('tipo', 'Tipo de proyecto'), ('departamento', 'Departamento'),
+                           ('comunidad', 'Comunidad beneficiaria'), ('municipio', 'Municipio')]:
+        categorica = pd.Categorical(df[columna].astype(object).where(df[columna].notna(), None))
+        categorias[clave] = [str(v) for v in categorica.categories]
+        codigos[clave] = categorica.codes.tolist()
+    
+    # Solo los municipios con proyectos; 'geo' es la posición en esa tabla reducida (-1 sin geometría)
+    posiciones_municipio = df['pos_municipio'].to_numpy()
+    usados, geo = pd.factorize(posiciones_municipio[posiciones_municipio >= 0])
+    indice_geo = np.full(len(df), -1, dtype=np.int64)
+    indice_geo[posiciones_municipio >= 0] = usados
+    
+    return {
+        'n': len(df),
+        'ano': columna_cliente(df, 'Año inicio'),
+        'costo': columna_cliente(df, 'Costo total ($COP)'),
+        'beneficiarios': columna_cliente(df, 'Beneficiarios totales'),
+        'area': columna_cliente(df, 'Área intervenida (ha)'),
+        'id': df['ID'].tolist(),
+        **codigos,
+        'categorias': categorias,
+        'geo': indice_geo.tolist(),
+        'municipios_geo': {
+            'codigo': nomenclator.codigos[geo].tolist(),
+            'nombre': nomenclator.nombres[geo].tolist(),
+            'depto': nomenclator.departamentos[geo].tolist()
+        },
+        'tipos_mapa': tipos_mapa,
+        'modo_mapa': modo_mapa,
+        'rango_anos': [int(df['Año inicio'].min()), int(df['Año inicio'].max())],
+        'rango_costos': list(rango_costos),
+        # f"{suma:,}" de Python: sin decimales si la columna es entera
+        'decimales_beneficiarios': 0 if pd.api.types.is_integer_dtype(df['Beneficiarios totales']) else 1
+    }
+
+def construir_datos(version, anterior):
+    """Instantánea de proyectos.xlsx: tabla, índices y todo lo que depende de ellos."""
+    df, motor_filtros, sin_municipio, filas_invalidas = cargar_base_datos()
+    tipos_mapa = sorted(df['Tipo de proyecto'].astype(str).unique())
+    codigos_mapa = nomenclator.codigos[df.loc[df['pos_municipio'] >= 0, 'pos_municipio'].unique()]
+    
+    # Con los mismos tipos y municipios se reutiliza la figura base (y su GeoJSON publicado)
+    if anterior is not None and anterior.tipos_mapa == tipos_mapa and np.array_equal(anterior.codigos_mapa, codigos_mapa):
+        figura_base = anterior.figura_base
+        url_geojson = anterior.url_geojson
+    else:
+        url_geojson = publicar_geojson('nacional', codigos_mapa)
+        figura_base = construir_figura_base(tipos_mapa, url_geojson)
+    
+    # Fila del shapefile -> nombre del municipio en la tabla (el de las tarjetas y el índice de proyectos)
+    emparejados = df.loc[df['pos_municipio'] >= 0, ['pos_municipio', 'Municipio']].drop_duplicates('pos_municipio')
+    municipio_por_posicion = dict(zip(emparejados['pos_municipio'].tolist(), emparejados['Municipio'].astype(str).tolist()))
+    
+    # El modo de filtrado se decide con la primera carga: los callbacks se registran una sola vez
+    cliente = len(df) <= umbral_cliente if anterior is None else anterior.tabla_cliente is not None
+    
+    return SimpleNamespace(
+        version=version,
+        fecha=datetime.fromtimestamp(os.stat(proyectos_path).st_mtime),
+        df=df,
+        motor_filtros=motor_filtros,
+        sin_municipio=sin_municipio,
+        filas_invalidas=filas_invalidas,
+        rango_anos=(int(df['Año inicio'].min()), int(df['Año inicio'].max())),
+        tipos_mapa=tipos_mapa,
+        codigos_mapa=codigos_mapa,
+        figura_base=figura_base,
+        url_geojson=url_geojson,
+        firma_geo=registrar_firma_geo(codigos_mapa),
+        indice_proyectos=IndiceProyectos(df),
+        municipio_por_posicion=municipio_por_posicion,
+        tabla_cliente=construir_tabla_cliente(df, tipos_mapa) if cliente else None,
+        cubo_kpis=CuboKPIs(df)
+    )
+
+def al_publicar_datos(datos):
+    # Los resultados anteriores ya no se pueden pedir (claves con otra versión): se libera la memoria
+    cache_resultados.limpiar()
+    if isinstance(almacen_resultados, CacheLRU):
+        almacen_resultados.limpiar()
+    precalcular_vista_inicial(datos)
+
+# Recarga en caliente: un hilo vigila proyectos.xlsx y publica una nueva instantánea si cambia
+recarga_datos = RecargaDatos(
+    proyectos_path,
+    construir_datos,
+    intervalo=int(os.environ.get('AIP_INTERVALO_RECARGA', 30)),
+    al_publicar=al_publicar_datos
+)
+filtrado_cliente = recarga_datos.actual.tabla_cliente is not None
+
+@server.before_request
+def iniciar_recarga():
+    # En la primera petición de cada proceso: con preload_app el maestro no arranca hilos antes del fork
+    recarga_datos.iniciar()
+
 # 4. Layout móvil (resto del código permanece igual)
-app.layout = html.Div(style=styles['container'], children=[
-    # Encabezado
-    html.Div(style=styles['header-container'], children=[
-        html.Div([
-            html.Img(src=huella_encoded, style=styles['huella-img']) if huella_encoded else None,
-            html.H1("NUESTRA HUELLA EN COLOMBIA", style=styles['header'])
-        ], style={'display': 'flex', 'alignItems': 'center'}),
-        html.Img(src=logo_encoded, style=styles['logo']) if logo_encoded else None
-    ]),
-    
-    # Filtros
-    html.Div(style=styles['filters'], children=[
-        html.Div([
-            html.Label("TIPO DE PROYECTO", style=styles['filter-label']),
-            dcc.Dropdown(
-                id='tipo-dropdown',
-                options=[{'label': t, 'value': t} for t in sorted(df['Tipo de proyecto'].unique())],
-                multi=True,
-                placeholder="Seleccione tipos...",
-                style=styles['dropdown']
-            ),
+def opciones_filtro(df, columna):
+    return [{'label': v, 'value': v} for v in sorted(df[columna].dropna().unique())]
+
+def marcas_anos(rango_anos):
+    return {str(year): str(year) for year in range(rango_anos[0], rango_anos[1] + 1)}
+
+def texto_fecha_datos(datos):
+    # Fecha de modificación de proyectos.xlsx, no la del arranque del servidor
+    return f"Datos actualizados al {datos.fecha.strftime('%d/%m/%Y')}"
+
+def construir_layout():
+    # Función: cada carga de página toma la instantánea de datos vigente
+    datos = recarga_datos.actual
+    return html.Div(style=styles['container'], children=[
+        # Encabezado
+        html.Div(style=styles['header-container'], children=[
+            html.Div([
+                imagen_huella,
+                html.H1("NUESTRA HUELLA EN COLOMBIA", style=styles['header'])
+            ], style={'display': 'flex', 'alignItems': 'center'}),
+            imagen_logo
+        ]),
+    
+        # Filtros
+        html.Div(style=styles['filters'], children=[
+            html.Div([
+                html.Label("TIPO DE PROYECTO", style=styles['filter-label']),
+                dcc.Dropdown(
+                    id='tipo-dropdown',
+                    options=opciones_filtro(datos.df, 'Tipo de proyecto'),
+                    multi=True,
+                    placeholder="Seleccione tipos...",
+                    style=styles['dropdown']
+                ),
             
-            html.Label("DEPARTAMENTO", style=styles['filter-label']),
-            dcc.Dropdown(
-                id='departamento-dropdown',
-                options=[{'label': d, 'value': d} for d in sorted(df['Departamento'].unique())],
-                multi=True,
-                placeholder="Seleccione departamentos...",
-                style=styles['dropdown']
-            ),
+                html.Label("DEPARTAMENTO", style=styles['filter-label']),
+                dcc.Dropdown(
+                    id='departamento-dropdown',
+                    options=opciones_filtro(datos.df, 'Departamento'),
+                    multi=True,
+                    placeholder="Seleccione departamentos...",
+                    style=styles['dropdown']
+                ),
             
-            html.Label("COMUNIDAD BENEFICIARIA", style=styles['filter-label']),
-            dcc.Dropdown(
-                id='comunidad-dropdown',
-                options=[{'label': c, 'value': c} for c in sorted(df['Comunidad beneficiaria'].unique())],
-                multi=True,
-                placeholder="Seleccione comunidades...",
-                style=styles['dropdown']
-            ),
+                html.Label("COMUNIDAD BENEFICIARIA", style=styles['filter-label']),
+                dcc.Dropdown(
+                    id='comunidad-dropdown',
+                    options=opciones_filtro(datos.df, 'Comunidad beneficiaria'),
+                    multi=True,
+                    placeholder="Seleccione comunidades...",
+                    style=styles['dropdown']
+                ),
             
-            html.Label("RANGO DE COSTOS (MILLONES $COP)", style=styles['filter-label']),
-            dcc.RangeSlider(
-                id='costo-slider',
-                min=0,
-                max=7000,
-                value=[0, 7000],
-                marks={i: f"{i}" for i in range(0, 7001, 1000)},
-                step=50,
-                tooltip={"placement": "bottom", "always_visible": True}
-            ),
+                html.Label("RANGO DE COSTOS (MILLONES $COP)", style=styles['filter-label']),
+                dcc.RangeSlider(
+                    id='costo-slider',
+                    min=rango_costos[0],
+                    max=rango_costos[1],
+                    value=list(rango_costos),
+                    marks={i: f"{i}" for i in range(rango_costos[0], rango_costos[1] + 1, 1000)},
+                    step=50,
+                    # El valor se publica al soltar: el tooltip muestra el rango durante el arrastre
+                    updatemode='mouseup',
+                    tooltip={"placement": "bottom", "always_visible": True}
+                ),
             
-            html.Label("RANGO DE AÑOS", style=styles['filter-label']),
-            dcc.RangeSlider(
-                id='year-slider',
-                min=df['Fecha inicio'].dt.year.min(),
-                max=df['Fecha inicio'].dt.year.max(),
-                value=[df['Fecha inicio'].dt.year.min(), df['Fecha inicio'].dt.year.max()],
-                marks={str(year): str(year) for year in range(df['Fecha inicio'].dt.year.min(), df['Fecha inicio'].dt.year.max()+1)},
-                step=None,
-                tooltip={"placement": "bottom", "always_visible": True}
-            )
-        ])
-    ]),
-    
-    # KPIs
-    html.Div("INFORMACIÓN GENERAL", style=styles['section-title']),
-    html.Div(style={'display': 'grid', 'gridTemplateColumns': 'repeat(2, 1fr)', 'gap': '10px'}, children=[
-        html.Div(style=styles['card'], children=[
-            html.Div("📌 TOTAL PROYECTOS", style=styles['kpi-title']),
-            html.Div(id='total-proyectos', style=styles['kpi-value'])
+                html.Label("RANGO DE AÑOS", style=styles['filter-label']),
+                dcc.RangeSlider(
+                    id='year-slider',
+                    min=datos.rango_anos[0],
+                    max=datos.rango_anos[1],
+                    value=list(datos.rango_anos),
+                    marks=marcas_anos(datos.rango_anos),
+                    step=None,
+                    updatemode='mouseup',
+                    tooltip={"placement": "bottom", "always_visible": True}
+                )
+            ])
         ]),
-        html.Div(style=styles['card'], children=[
-            html.Div("💰 INVERSIÓN TOTAL", style=styles['kpi-title']),
-            html.Div(id='total-inversion', style=styles['kpi-value'])
+    
+        # KPIs
+        html.Div("INFORMACIÓN GENERAL", style=styles['section-title']),
+        html.Div(style={'display': 'grid', 'gridTemplateColumns': 'repeat(2, 1fr)', 'gap': '10px'}, children=[
+            html.Div(style=styles['card'], children=[
+                html.Div("📌 TOTAL PROYECTOS", style=styles['kpi-title']),
+                html.Div(id='total-proyectos', style=styles['kpi-value'])
+            ]),
+            html.Div(style=styles['card'], children=[
+                html.Div("💰 INVERSIÓN TOTAL", style=styles['kpi-title']),
+                html.Div(id='total-inversion', style=styles['kpi-value'])
+            ]),
+            html.Div(style=styles['card'], children=[
+                html.Div("👥 BENEFICIARIOS", style=styles['kpi-title']),
+                html.Div(id='total-beneficiarios', style=styles['kpi-value'])
+            ]),
+            html.Div(style=styles['card'], children=[
+                html.Div("🌿 ÁREA INTERVENIDA", style=styles['kpi-title']),
+                html.Div(id='total-area', style=styles['kpi-value'])
+            ])
         ]),
-        html.Div(style=styles['card'], children=[
-            html.Div("👥 BENEFICIARIOS", style=styles['kpi-title']),
-            html.Div(id='total-beneficiarios', style=styles['kpi-value'])
+    
+        # Mapa
+        html.Div("UBICACIÓN DE PROYECTOS", style=styles['section-title']),
+        html.Div(style=styles['map-container'], children=[
+            dcc.Graph(
+                id='mapa', 
+                figure=datos.figura_base,
+                config={'displayModeBar': False},
+                style={'height': '100%'}
+            ),
+            # Aviso mientras el mapa se construye en segundo plano (AIP_CALLBACKS_FONDO=1)
+            html.Div(id='mapa-progreso', style={'display': 'none'})
         ]),
-        html.Div(style=styles['card'], children=[
-            html.Div("🌿 ÁREA INTERVENIDA", style=styles['kpi-title']),
-            html.Div(id='total-area', style=styles['kpi-value'])
-        ])
-    ]),
-    
-    # Mapa
-    html.Div("UBICACIÓN DE PROYECTOS", style=styles['section-title']),
-    html.Div(style=styles['map-container'], children=[
-        dcc.Graph(
-            id='mapa', 
-            config={'displayModeBar': False},
-            style={'height': '100%'}
-        )
-    ]),
-    
-    # Lista de municipios
-    html.Div("MUNICIPIOS CON PROYECTOS", style=styles['section-title']),
-    html.Div(style=styles['municipios-list'], children=[
-        html.Div("SELECCIONE UN MUNICIPIO", style=styles['municipios-title']),
-        html.Div(id='municipios-cards-container')
-    ]),
-    
-    # Panel de información
-    html.Div("INFORMACIÓN DEL MUNICIPIO", style=styles['section-title']),
-    html.Div(style=styles['info-panel'], children=[
-        html.Div(style=styles['info-section'], children=[
-            html.Div("📍 MUNICIPIO", style=styles['info-title']),
-            html.Div(id='municipio-value', style=styles['info-value'])
+    
+        # Lista de municipios
+        html.Div("MUNICIPIOS CON PROYECTOS", style=styles['section-title']),
+        html.Div(style=styles['municipios-list'], children=[
+            html.Div("SELECCIONE UN MUNICIPIO", style=styles['municipios-title']),
+            html.Div(id='municipios-cards-container'),
+            html.Button(id='mas-municipios', n_clicks=0, style={'display': 'none'})
         ]),
-        html.Div(style=styles['info-section'], children=[
-            html.Div("🏦 ENTIDAD FINANCIADORA", style=styles['info-title']),
-            html.Div(id='financiador-value', style=styles['info-value'])
+    
+        # Panel de información
+        html.Div("INFORMACIÓN DEL MUNICIPIO", style=styles['section-title']),
+        html.Div(style=styles['info-panel'], children=[
+            html.Div(style=styles['info-section'], children=[
+                html.Div("📍 MUNICIPIO", style=styles['info-title']),
+                html.Div(id='municipio-value', style=styles['info-value'])
+            ]),
+            html.Div(style=styles['info-section'], children=[
+                html.Div("🏦 ENTIDAD FINANCIADORA", style=styles['info-title']),
+                html.Div(id='financiador-value', style=styles['info-value'])
+            ]),
+            html.Div(style=styles['info-section'], children=[
+                html.Div("⏳ DURACIÓN (MESES)", style=styles['info-title']),
+                html.Div(id='duracion-value', style=styles['info-value'])
+            ]),
+            html.Div(style=styles['info-section'], children=[
+                html.Div("👥 BENEFICIARIOS", style=styles['info-title']),
+                html.Div(id='beneficiarios-value', style=styles['info-value'])
+            ]),
+            html.Div(style=styles['info-section'], children=[
+                html.Div("🌳 HECTÁREAS", style=styles['info-title']),
+                html.Div(id='area-value', style=styles['info-value'])
+            ]),
+            html.Div(style=styles['info-section'], children=[
+                html.Div("📦 PRODUCTO", style=styles['info-title']),
+                html.Div(id='producto-value', style=styles['info-value'])
+            ])
         ]),
-        html.Div(style=styles['info-section'], children=[
-            html.Div("⏳ DURACIÓN (MESES)", style=styles['info-title']),
-            html.Div(id='duracion-value', style=styles['info-value'])
+    
+        # Fotografías
+        html.Div("EVIDENCIA FOTOGRÁFICA", style=styles['section-title']),
+        html.Div(style=styles['photo-panel'], children=[
+            html.Div("SELECCIONE UN PROYECTO", style=styles['photo-title']),
+            dcc.Dropdown(
+                id='proyecto-selector',
+                style=styles['dropdown']
+            ),
+            html.Div(id='photo-buttons', style={'display': 'flex', 'flexWrap': 'wrap', 'justifyContent': 'center'})
         ]),
-        html.Div(style=styles['info-section'], children=[
-            html.Div("👥 BENEFICIARIOS", style=styles['info-title']),
-            html.Div(id='beneficiarios-value', style=styles['info-value'])
+    
+        # Modal para fotos
+        html.Div(id='photo-modal', style={'display': 'none'}, children=[
+            html.Div(style=styles['modal'], children=[
+                html.Div(style=styles['modal-content'], children=[
+                    html.Img(id='modal-image', style=styles['modal-image']),
+                    html.Button("Cerrar", id='close-modal', style=styles['close-button'])
+                ])
+            ])
         ]),
-        html.Div(style=styles['info-section'], children=[
-            html.Div("🌳 HECTÁREAS", style=styles['info-title']),
-            html.Div(id='area-value', style=styles['info-value'])
+    
+        # Pie de página
+        html.Div(style={
+            'textAlign': 'center',
+            'color': colors['gold'],  # Cambiado a dorado
+            'marginTop': '15px',
+            'fontSize': '12px',
+            'padding': '10px',
+            'borderTop': f'1px solid {colors["gold"]}'  # Borde superior dorado
+        }, children=[
+            html.P("© 2025 Fundación AIP"),
+            html.P(texto_fecha_datos(datos), id='fecha-datos')
         ]),
-        html.Div(style=styles['info-section'], children=[
-            html.Div("📦 PRODUCTO", style=styles['info-title']),
-            html.Div(id='producto-value', style=styles['info-value'])
-        ])
-    ]),
-    
-    # Fotografías
-    html.Div("EVIDENCIA FOTOGRÁFICA", style=styles['section-title']),
-    html.Div(style=styles['photo-panel'], children=[
-        html.Div("SELECCIONE UN PROYECTO", style=styles['photo-title']),
-        dcc.Dropdown(
-            id='proyecto-selector',
-            style=styles['dropdown']
-        ),
-        html.Div(id='photo-buttons', style={'display': 'flex', 'flexWrap': 'wrap', 'justifyContent': 'center'})
-    ]),
-    
-    # Modal para fotos
-    html.Div(id='photo-modal', style={'display': 'none'}, children=[
-        html.Div(style=styles['modal'], children=[
-            html.Div(style=styles['modal-content'], children=[
-                html.Img(id='modal-image', style=styles['modal-image']),
-                html.Button("Cerrar", id='close-modal', style=styles['close-button'])
-            ])
-        ])
-    ]),
     
-    # Pie de página
-    html.Div(style={
-        'textAlign': 'center',
-        'color': colors['gold'],  # Cambiado a dorado
-        'marginTop': '15px',
-        'fontSize': '12px',
-        'padding': '10px',
-        'borderTop': f'1px solid {colors["gold"]}'  # Borde superior dorado
-    }, children=[
-        html.P("© 2025 Fundación AIP"),
-        html.P(f"Datos actualizados al {datetime.now().strftime('%d/%m/%Y')}")
-    ]),
-    
-    # Almacenamiento
-    dcc.Store(id='filtered-data'),
-    dcc.Store(id='selected-municipio'),
-    dcc.Store(id='photo-store')
-])
+        # Almacenamiento
+        # Id aleatorio por carga de página: clave de la cola de filtros (ver coalescencia.py)
+        dcc.Store(id='pestana', data=secrets.token_urlsafe(12)),
+        dcc.Store(id='filtered-data'),
+        # URL del GeoJSON que usan ahora las trazas del mapa (None: el nacional de la figura base)
+        dcc.Store(id='mapa-geojson'),
+        dcc.Store(id='selected-municipio'),
+        dcc.Store(id='municipios-lista'),
+        dcc.Store(id='municipios-vista'),
+        dcc.Store(id='config-tarjetas', data=config_tarjetas),
+        dcc.Store(id='photo-store'),
+        dcc.Store(id='tabla-cliente', data=datos.tabla_cliente),
+    
+        # Recarga en caliente: las páginas abiertas revisan la versión de los datos
+        dcc.Store(id='version-datos', data=datos.version),
+        dcc.Interval(id='intervalo-datos', interval=max(recarga_datos.intervalo, 1) * 1000, disabled=recarga_datos.intervalo <= 0)
+    ])
+
+app.layout = construir_layout
 
 # 5. Callbacks (simplificados pero funcionales)
-@app.callback(
-    [Output('filtered-data', 'data'),
-     Output('total-proyectos', 'children'),
-     Output('total-inversion', 'children'),
-     Output('total-beneficiarios', 'children'),
-     Output('total-area', 'children'),
-     Output('mapa', 'figure')],
-    [Input('tipo-dropdown', 'value'),
-     Input('departamento-dropdown', 'value'),
-     Input('comunidad-dropdown', 'value'),
-     Input('year-slider', 'value'),
-     Input('costo-slider', 'value')]
-)
-def update_data(tipos, departamentos, comunidades, anos, costos):
-    filtered = df[
-        (df['Fecha inicio'].dt.year >= anos[0]) & 
-        (df['Fecha inicio'].dt.year <= anos[1]) &
-        (df['Costo total ($COP)'] >= costos[0]*1000000) &
-        (df['Costo total ($COP)'] <= costos[1]*1000000)
-    ]
+def normalizar_filtros(datos, tipos, departamentos, comunidades, anos, costos):
+    """Clave canónica del estado de filtros: listas ordenadas y rangos acotados a los sliders."""
+    def lista(valores):
+        return tuple(sorted(set(valores or [])))
     
-    if tipos:
-        filtered = filtered[filtered['Tipo de proyecto'].isin(tipos)]
-    if departamentos:
-        filtered = filtered[filtered['Departamento'].isin(departamentos)]
-    if comunidades:
-        filtered = filtered[filtered['Comunidad beneficiaria'].isin(comunidades)]
+    def rango(valores, minimo, maximo):
+        inicio, fin = sorted(min(max(v, minimo), maximo) for v in valores)
+        return (inicio, fin)
     
-    if filtered.empty:
-        fig = px.choropleth_mapbox(
-            center={"lat": 4.6, "lon": -74.1},
-            zoom=4.5
-        )
-        fig.update_layout(
-            mapbox_style="carto-positron",
-            margin={"r":0,"t":0,"l":0,"b":0},
-            annotations=[dict(
-                text="No hay datos con los filtros aplicados",
-                x=0.5,
-                y=0.5,
-                showarrow=False,
-                font=dict(size=14)
-            )]
-        )
-        return [], "0", "$0M", "0", "0 ha", fig
-    
-    filtered_with_geom = pd.merge(
-        filtered,
-        municipios_gdf[['MpNombre', 'Depto', 'geometry', 'lon', 'lat']],
-        left_on=['Municipio', 'Departamento'],
-        right_on=['MpNombre', 'Depto'],
-        how='left'
+    return (
+        lista(tipos),
+        lista(departamentos),
+        lista(comunidades),
+        rango(anos, *datos.rango_anos),
+        rango(costos, *rango_costos)
+    )
+
+def token_filtrado(datos, clave):
+    return hashlib.sha1(repr((datos.version, clave)).encode('utf-8')).hexdigest()[:16]
+
+def posiciones_filtrado(datos, filtered_data):
+    """Posiciones de fila (ordenadas) del resultado referenciado por el Store 'filtered-data'."""
+    # El token se deriva de los filtros y la versión vigente: tras una recarga no se
+    # reutilizan posiciones calculadas sobre la tabla anterior
+    clave = normalizar_filtros(datos, *filtered_data['filtros'])
+    token = token_filtrado(datos, clave)
+    posiciones = almacen_resultados.obtener(token)
+    if posiciones is None:
+        # Otro worker o un desalojo: se recalcula a partir de los filtros del Store
+        posiciones = datos.motor_filtros.query(*clave)
+        almacen_resultados.guardar(token, posiciones, posiciones.nbytes)
+    return posiciones
+
+def resolver_filtrado(datos, filtered_data):
+    """Filas del resultado referenciado por el Store 'filtered-data'."""
+    return datos.df.iloc[posiciones_filtrado(datos, filtered_data)]
+
+def agregar_por_municipio(proyectos):
+    """Una fila por municipio: número de proyectos, totales y tipo de proyecto dominante."""
+    agregados = proyectos.groupby('codigo', sort=False).agg(
+        MpNombre=('MpNombre', 'first'),
+        Depto=('Depto', 'first'),
+        Proyectos=('ID', 'size'),
+        Inversion=('Costo total ($COP)', 'sum'),
+        Beneficiarios=('Beneficiarios totales', 'sum'),
+        Area=('Área intervenida (ha)', 'sum')
     )
+    agregados['Inversion'] = agregados['Inversion'] / 1000000
     
-    filtered_gdf = gpd.GeoDataFrame(filtered_with_geom)
-    filtered_with_geometry = filtered_gdf[~filtered_gdf.geometry.isna()]
+    # En empate gana el primer tipo encontrado (orden estable)
+    conteo_tipos = proyectos.groupby(['codigo', 'Tipo de proyecto'], sort=False).size()
+    dominante = (
+        conteo_tipos.sort_values(ascending=False, kind='stable')
+        .reset_index()
+        .drop_duplicates('codigo')
+        .set_index('codigo')['Tipo de proyecto']
+    )
+    agregados['Tipo de proyecto'] = dominante
+    return agregados.reset_index()
+
+def construir_resultado(datos, tipos, departamentos, comunidades, anos, costos):
+    """Filas filtradas y los datos de cada traza del mapa (sin geometrías ni layout)."""
+    with metricas.etapa('filtro'):
+        posiciones = datos.motor_filtros.query(tipos, departamentos, comunidades, anos, costos)
+        filtered = datos.df.iloc[posiciones]
+    
+    if filtered.empty:
+        mapa = {'trazas': {}, 'anotacion': "No hay datos con los filtros aplicados"}
+        return {'posiciones': posiciones, 'mapa': mapa}
+    
+    with metricas.etapa('cruce'):
+        posiciones_municipio = filtered['pos_municipio'].to_numpy()
+        encontrados = posiciones_municipio[posiciones_municipio >= 0]
+        filtered_with_geometry = filtered[posiciones_municipio >= 0].assign(
+            MpNombre=nomenclator.nombres[encontrados],
+            Depto=nomenclator.departamentos[encontrados],
+            codigo=nomenclator.codigos[encontrados]
+        # Tipo como texto: las agrupaciones solo ven los tipos presentes en el subconjunto
+        ).astype({'Tipo de proyecto': str})
     
     if filtered_with_geometry.empty:
-        fig = px.choropleth_mapbox(
-            center={"lat": 4.6, "lon": -74.1},
-            zoom=4.5
-        )
-        fig.update_layout(
-            mapbox_style="carto-positron",
-            margin={"r":0,"t":0,"l":0,"b":0},
-            annotations=[dict(
-                text="No hay datos geográficos",
-                x=0.5,
-                y=0.5,
-                showarrow=False,
-                font=dict(size=14)
-            )]
-        )
+        mapa = {'trazas': {}, 'anotacion': "No hay datos geográficos"}
     else:
-        fig = px.choropleth_mapbox(
-            filtered_with_geometry,
-            geojson=filtered_with_geometry.geometry,
-            locations=filtered_with_geometry.index,
-            color="Tipo de proyecto",
-            center={"lat": 4.6, "lon": -74.1},
-            zoom=4.5,
-            opacity=0.7,
-            custom_data=['MpNombre', 'Depto', 'Tipo de proyecto', 'ID']
-        )
-        
-        fig.update_traces(
-            hovertemplate="<b>%{customdata[0]}</b><br>Depto: %{customdata[1]}<br>Proyecto: %{customdata[2]}"
-        )
-        
-        fig.add_trace(
-            px.scatter_mapbox(
-                aip_locations_gdf,
-                lat=aip_locations_gdf.geometry.y,
-                lon=aip_locations_gdf.geometry.x,
-                color_discrete_sequence=[colors['aip-locations']]
-            ).update_traces(
-                marker=dict(size=8),
-                name="Cobertura AIP",
-                hovertemplate="<b>%{customdata[0]}</b><br>%{customdata[1]}<extra></extra>",
-                customdata=aip_locations_gdf[["Municipio", "Departamen"]]
-            ).data[0]
+        with metricas.etapa('figura'):
+            if modo_mapa == 'agregado':
+                # Un polígono por municipio con los totales de sus proyectos
+                datos_mapa = agregar_por_municipio(filtered_with_geometry)
+            else:
+                datos_mapa = filtered_with_geometry
+            
+            trazas = {}
+            for tipo, grupo in datos_mapa.groupby('Tipo de proyecto', sort=False):
+                trazas[tipo] = {
+                    'locations': grupo['codigo'].tolist(),
+                    'customdata': grupo[columnas_hover].to_numpy().tolist()
+                }
+            mapa = {'trazas': trazas, 'anotacion': None}
+    
+    return {'posiciones': posiciones, 'mapa': mapa}
+
+def update_kpis(tipos, departamentos, comunidades, anos, costos):
+    """Las cuatro tarjetas de KPIs desde el cubo precalculado, sin esperar al mapa."""
+    datos = recarga_datos.actual
+    with metricas.etapa('kpis'):
+        total_proyectos, costo, beneficiarios, area = datos.cubo_kpis.consultar(
+            *normalizar_filtros(datos, tipos, departamentos, comunidades, anos, costos)
         )
+    if not total_proyectos:
+        return "0", "$0M", "0", "0 ha"
+    return (
+        total_proyectos,
+        f"${costo/1000000:,.0f}M",
+        f"{beneficiarios:,}",
+        f"{area:,.1f} ha"
+    )
+
+def patch_mapa(datos, mapa):
+    """Actualización parcial de la figura base: solo ubicaciones, datos de hover y anotación."""
+    patch = Patch()
+    for i, tipo in enumerate(datos.tipos_mapa):
+        traza = mapa['trazas'].get(tipo, {'locations': [], 'customdata': []})
+        patch['data'][i]['locations'] = traza['locations']
+        patch['data'][i]['z'] = [1] * len(traza['locations'])
+        patch['data'][i]['customdata'] = traza['customdata']
+        patch['data'][i]['showlegend'] = bool(traza['locations'])
     
-    fig.update_layout(
-        mapbox_style="carto-positron",
-        margin={"r":0,"t":0,"l":0,"b":0},
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    if mapa['anotacion']:
+        patch['layout']['annotations'] = [dict(
+            text=mapa['anotacion'],
+            x=0.5,
+            y=0.5,
+            showarrow=False,
+            font=dict(size=14)
+        )]
+    else:
+        patch['layout']['annotations'] = []
+    return patch
+
+def calcular_resultado(datos, clave):
+    resultado = construir_resultado(datos, *clave)
+    # Los datos del mapa se guardan serializados: un único str en vez de un árbol de objetos
+    with metricas.etapa('serializacion'):
+        resultado['mapa'] = json.dumps(resultado['mapa'], cls=PlotlyJSONEncoder)
+    cache_resultados.guardar((datos.version, clave), resultado, len(resultado['mapa']) + resultado['posiciones'].nbytes)
+    return resultado
+
+def resultado_en_cache(datos, clave):
+    resultado = cache_resultados.obtener((datos.version, clave))
+    if resultado is None:
+        resultado = calcular_resultado(datos, clave)
+    return resultado
+
+def update_data(tipos, departamentos, comunidades, anos, costos, pestana=None):
+    datos = recarga_datos.actual
+    clave = normalizar_filtros(datos, tipos, departamentos, comunidades, anos, costos)
+    resultado = cache_resultados.obtener((datos.version, clave))
+    if resultado is None:
+        # Sin id de pestaña (llamadas directas) se calcula sin encolar
+        sesion = None if pestana is None else (pestana, 'filtered-data.data')
+        try:
+            resultado = cola_filtros.ejecutar(sesion, lambda: calcular_resultado(datos, clave))
+        except Reemplazada:
+            # El navegador ya espera la respuesta de la petición más nueva
+            raise PreventUpdate
+        except ColaLlena:
+            logger.warning("Cola de filtros llena: %s", cola_filtros.estadisticas())
+            flask.abort(503)
+    
+    posiciones = resultado['posiciones']
+    filtered_data = None
+    if len(posiciones):
+        token = token_filtrado(datos, clave)
+        # Con el almacén en disco guardar es escribir un .npy y listar el directorio
+        if not almacen_resultados.contiene(token):
+            almacen_resultados.guardar(token, posiciones, posiciones.nbytes)
+        filtered_data = {'filtros': clave, 'total': len(posiciones)}
+    
+    with metricas.etapa('figura'):
+        patch = patch_mapa(datos, json.loads(resultado['mapa']))
+    
+    return filtered_data, patch
+
+def update_data_fondo(set_progress, tipos, departamentos, comunidades, anos, costos):
+    """update_data en un proceso hijo, con cupo; el resultado vuelve por el diskcache."""
+    # Sin las caches del worker: sus locks pudieron quedar tomados al hacer fork y lo que
+    # se guarde aquí no llega al worker (update_municipios_list recalcula las posiciones)
+    datos = recarga_datos.actual
+    clave = normalizar_filtros(datos, tipos, departamentos, comunidades, anos, costos)
+    with cupos_fondo.ocupar(al_esperar=lambda: set_progress("En espera de otro mapa…")):
+        set_progress("Construyendo mapa…")
+        resultado = construir_resultado(datos, *clave)
+    
+    posiciones = resultado['posiciones']
+    filtered_data = {'filtros': clave, 'total': len(posiciones)} if len(posiciones) else None
+    return filtered_data, patch_mapa(datos, resultado['mapa'])
+
+def precalcular_vista_inicial(datos):
+    resultado_en_cache(datos, normalizar_filtros(datos, None, None, None, datos.rango_anos, rango_costos))
+
+# Vista inicial precalculada; con preload_app queda en la memoria compartida de los workers
+precalcular_vista_inicial(recarga_datos.actual)
+
+
+def update_municipios_list(filtered_data):
+    """Municipios del resultado y su número de proyectos, con un solo value_counts."""
+    if not filtered_data:
+        return None
+    
+    with metricas.etapa('filtro'):
+        filtered_df = resolver_filtrado(recarga_datos.actual, filtered_data)
+    with metricas.etapa('conteo'):
+        conteos = filtered_df['Municipio'].value_counts(sort=False)
+        conteos = conteos[conteos > 0]
+        conteos.index = conteos.index.astype(str)
+        conteos = conteos.sort_index()
+    return {'municipios': conteos.index.tolist(), 'conteos': conteos.tolist()}
+
+entradas_filtros = [
+    Input('tipo-dropdown', 'value'),
+    Input('departamento-dropdown', 'value'),
+    Input('comunidad-dropdown', 'value'),
+    Input('year-slider', 'value'),
+    Input('costo-slider', 'value')
+]
+salidas_kpis = [
+    Output('total-proyectos', 'children'),
+    Output('total-inversion', 'children'),
+    Output('total-beneficiarios', 'children'),
+    Output('total-area', 'children')
+]
+salidas_mapa = [
+    Output('filtered-data', 'data'),
+    Output('mapa', 'figure')
+]
+
+if filtrado_cliente:
+    # KPIs, mapa y lista de municipios calculados en el navegador en un solo callback
+    app.clientside_callback(
+        ClientsideFunction(namespace='aip', function_name='filtrar'),
+        [salidas_mapa[0], *salidas_kpis, salidas_mapa[1], Output('municipios-lista', 'data')],
+        entradas_filtros,
+        [State('tabla-cliente', 'data'),
+         State('mapa', 'figure')]
     )
+else:
+    # Con AIP_CALLBACKS_FONDO=1 el mapa se construye en procesos hijos (como mucho
+    # AIP_FONDO_MAX_PROCESOS a la vez) y los hilos del worker siguen atendiendo el resto
+    gestor_fondo = None
+    if os.environ.get('AIP_CALLBACKS_FONDO') == '1':
+        directorio_fondo = os.environ.get('AIP_FONDO_DIR', '/tmp/aip-fondo')
+        gestor_fondo = crear_gestor(
+            directorio_fondo,
+            cache_by=[lambda: recarga_datos.actual.version],
+            max_mb=int(os.environ.get('AIP_FONDO_MAX_MB', 256))
+        )
+        if gestor_fondo is None:
+            logger.warning(
+                "AIP_CALLBACKS_FONDO=1 pero falta dash[diskcache] (diskcache, multiprocess, psutil): "
+                "el mapa se calcula en los hilos del worker"
+            )
+        cupos_fondo = CuposProceso(
+            os.path.join(directorio_fondo, 'cupos'),
+            int(os.environ.get('AIP_FONDO_MAX_PROCESOS', 2))
+        )
+    if gestor_fondo is not None:
+        app.callback(
+            salidas_mapa,
+            entradas_filtros,
+            background=True,
+            manager=gestor_fondo,
+            interval=250,
+            running=[(Output('mapa-progreso', 'style'), styles['mapa-progreso'], {'display': 'none'})],
+            progress=[Output('mapa-progreso', 'children')],
+            progress_default=[""]
+        )(update_data_fondo)
+    else:
+        app.callback(salidas_mapa, entradas_filtros + [State('pestana', 'data')])(metricas.medir(update_data))
+    # Los KPIs van en su propia petición: responden del cubo aunque el mapa tarde
+    app.callback(salidas_kpis, entradas_filtros)(metricas.medir(update_kpis))
+    app.callback(
+        Output('municipios-lista', 'data'),
+        [Input('filtered-data', 'data')]
+    )(metricas.medir(update_municipios_list))
+
+# Tarjetas paginadas; la selección solo redibuja las tarjetas afectadas (sin ida al servidor)
+app.clientside_callback(
+    ClientsideFunction(namespace='aip', function_name='tarjetas'),
+    [Output('municipios-cards-container', 'children'),
+     Output('municipios-vista', 'data'),
+     Output('mas-municipios', 'style'),
+     Output('mas-municipios', 'children')],
+    [Input('municipios-lista', 'data'),
+     Input('mas-municipios', 'n_clicks'),
+     Input('selected-municipio', 'data')],
+    [State('config-tarjetas', 'data'),
+     State('municipios-cards-container', 'children'),
+     State('municipios-vista', 'data')]
+)
+
+@app.callback(
+    [Output('version-datos', 'data'),
+     Output('tipo-dropdown', 'options'),
+     Output('tipo-dropdown', 'value'),
+     Output('departamento-dropdown', 'options'),
+     Output('departamento-dropdown', 'value'),
+     Output('comunidad-dropdown', 'options'),
+     Output('comunidad-dropdown', 'value'),
+     Output('year-slider', 'min'),
+     Output('year-slider', 'max'),
+     Output('year-slider', 'marks'),
+     Output('year-slider', 'value'),
+     Output('mapa', 'figure', allow_duplicate=True),
+     Output('mapa-geojson', 'data'),
+     Output('tabla-cliente', 'data'),
+     Output('fecha-datos', 'children')],
+    [Input('intervalo-datos', 'n_intervals')],
+    [State('version-datos', 'data'),
+     State('tipo-dropdown', 'value'),
+     State('departamento-dropdown', 'value'),
+     State('comunidad-dropdown', 'value'),
+     State('year-slider', 'value'),
+     State('year-slider', 'min'),
+     State('year-slider', 'max')],
+    prevent_initial_call=True
+)
+@metricas.medir
+def refrescar_datos(n_intervals, version, tipos, departamentos, comunidades, anos, ano_min, ano_max):
+    """Lleva una página abierta a la versión de datos vigente tras una recarga."""
+    datos = recarga_datos.actual
+    if version == datos.version:
+        raise PreventUpdate
     
-    total_proyectos = len(filtered)
-    total_inversion = f"${filtered['Costo total ($COP)'].sum()/1000000:,.0f}M"
-    total_beneficiarios = f"{filtered['Beneficiarios totales'].sum():,}"
-    total_area = f"{filtered['Área intervenida (ha)'].sum():,.1f} ha"
+    opciones = [opciones_filtro(datos.df, columna) for columna in ['Tipo de proyecto', 'Departamento', 'Comunidad beneficiaria']]
+    # Se conservan las selecciones que siguen existiendo; al escribir los valores
+    # se vuelven a disparar los callbacks de filtrado sobre la figura base nueva
+    valores = [
+        [v for v in (seleccion or []) if v in {o['value'] for o in opcion}]
+        for seleccion, opcion in zip([tipos, departamentos, comunidades], opciones)
+    ]
+    if anos and list(anos) == [ano_min, ano_max]:
+        # El slider cubría todo el rango anterior: sigue cubriéndolo, con los años nuevos
+        anos = datos.rango_anos
+    else:
+        anos = normalizar_filtros(datos, None, None, None, anos, rango_costos)[3]
     
     return (
-        filtered.to_dict('records'),
-        total_proyectos,
-        total_inversion,
-        total_beneficiarios,
-        total_area,
-        fig
+        datos.version,
+        opciones[0], valores[0],
+        opciones[1], valores[1],
+        opciones[2], valores[2],
+        datos.rango_anos[0],
+        datos.rango_anos[1],
+        marcas_anos(datos.rango_anos),
+        list(anos),
+        datos.figura_base,
+        None,
+        datos.tabla_cliente,
+        texto_fecha_datos(datos)
     )
 
 @app.callback(
-    Output('municipios-cards-container', 'children'),
-    [Input('filtered-data', 'data')],
-    [State('selected-municipio', 'data')]
+    [Output('mapa', 'figure', allow_duplicate=True),
+     Output('mapa-geojson', 'data')],
+    [Input('mapa', 'relayoutData')],
+    [State('mapa-geojson', 'data')],
+    prevent_initial_call=True
 )
-def update_municipios_list(filtered_data, selected_municipio):
-    if not filtered_data:
-        return html.Div("No hay municipios con los filtros actuales", style={
-            'textAlign': 'center', 
-            'color': 'white', 
-            'padding': '10px'
-        })
-    
-    filtered_df = pd.DataFrame(filtered_data)
-    municipios = filtered_df['Municipio'].unique()
-    
-    cards = []
-    for municipio in sorted(municipios):
-        count = len(filtered_df[filtered_df['Municipio'] == municipio])
-        is_selected = municipio == selected_municipio
-        
-        card_style = styles['municipio-card-selected'] if is_selected else styles['municipio-card']
-        name_style = styles['municipio-name-selected'] if is_selected else styles['municipio-name']
-        count_style = styles['municipio-projects-selected'] if is_selected else styles['municipio-projects']
-        
-        cards.append(
-            html.Div(
-                [
-                    html.Div(municipio, style=name_style),
-                    html.Div(f"{count} proyecto{'s' if count > 1 else ''}", style=count_style)
-                ],
-                id={'type': 'municipio-card', 'index': municipio},
-                style=card_style,
-                n_clicks=0
-            )
-        )
+@metricas.medir
+def geometria_por_zoom(relayout, url_actual):
+    """Pasa las trazas al GeoJSON del nivel de detalle del zoom, con solo la ventana visible."""
+    datos = recarga_datos.actual
+    url = url_geojson_zoom(datos, relayout or {})
+    if url is None or url == (url_actual or datos.url_geojson) or not datos.tipos_mapa:
+        raise PreventUpdate
     
-    return cards if cards else html.Div("No hay municipios con los filtros actuales", style={
-        'textAlign': 'center', 
-        'color': 'white', 
-        'padding': '10px'
-    })
+    patch = Patch()
+    for i in range(len(datos.tipos_mapa)):
+        patch['data'][i]['geojson'] = url
+    return patch, url
+
+def posicion_clic(point):
+    """Fila del shapefile del punto clicado: por código (polígonos), punto de cobertura o lat/lon."""
+    if 'location' in point:
+        return posicion_codigo.get(point['location'], -1)
+    if point.get('curveNumber') == len(recarga_datos.actual.tipos_mapa) and 'pointIndex' in point:
+        return int(aip_posiciones[point['pointIndex']])
+    if 'lat' in point and 'lon' in point:
+        return indice_espacial.municipio_en(point['lon'], point['lat'])
+    return -1
 
 @app.callback(
     [Output('selected-municipio', 'data'),
@@ -707,8 +1348,11 @@ def update_municipios_list(filtered_data, selected_municipio):
     [State('filtered-data', 'data'),
      State({'type': 'municipio-card', 'index': ALL}, 'id')]
 )
+@metricas.medir
 def handle_selection(clicks, map_click, selected_proyecto, filtered_data, municipio_ids):
     ctx = callback_context
+    datos = recarga_datos.actual
+    indice = datos.indice_proyectos
     
     if not ctx.triggered or not filtered_data:
         return [None, "Seleccione", "0", "N/A", "0", "0", "N/A", [], None, [], None]
@@ -717,54 +1361,59 @@ def handle_selection(clicks, map_click, selected_proyecto, filtered_data, munici
     
     if trigger_id == 'mapa.clickData':
         if map_click and 'points' in map_click and map_click['points']:
-            point = map_click['points'][0]
-            municipio = point['customdata'][0] if 'customdata' in point and point['customdata'] else None
+            municipio = datos.municipio_por_posicion.get(posicion_clic(map_click['points'][0]))
         else:
             return [None, "Seleccione", "0", "N/A", "0", "0", "N/A", [], None, [], None]
     elif trigger_id == 'proyecto-selector.value':
-        filtered_df = pd.DataFrame(filtered_data)
-        municipio_data = filtered_df[filtered_df['ID'] == selected_proyecto]
-        if not municipio_data.empty:
-            municipio = municipio_data.iloc[0]['Municipio']
-        else:
+        with metricas.etapa('filtro'):
+            filtradas = posiciones_filtrado(datos, filtered_data)
+        posicion = indice.posicion_id(selected_proyecto, filtradas)
+        if posicion is None:
             raise PreventUpdate
+        municipio = datos.df['Municipio'].iat[posicion]
     else:
-        municipio = json.loads(trigger_id.split('.')[0].replace("'", '"'))['index']
+        # t['value'] no sirve: Dash 2.11 busca el valor con el id en ASCII y el navegador lo
+        # manda en UTF-8, así que vale None en los municipios con tilde. Se usa el índice
+        # del prop_id y el n_clicks posicional; las tarjetas recién dibujadas (otra página,
+        # cambio de resaltado) llegan con n_clicks=0
+        clics = {id_tarjeta['index']: n for id_tarjeta, n in zip(municipio_ids, clicks)}
+        pulsados = [
+            json.loads(t['prop_id'].rsplit('.', 1)[0])['index'] for t in ctx.triggered
+            if t['prop_id'].startswith('{')
+        ]
+        pulsados = [indice_tarjeta for indice_tarjeta in pulsados if clics.get(indice_tarjeta)]
+        if not pulsados:
+            raise PreventUpdate
+        municipio = pulsados[0]
     
-    filtered_df = pd.DataFrame(filtered_data)
-    municipio_data = filtered_df[filtered_df['Municipio'] == municipio]
+    # Índice por municipio: solo se tocan las filas del municipio, no todo el resultado filtrado
+    with metricas.etapa('filtro'):
+        filtradas = posiciones_filtrado(datos, filtered_data)
+    posiciones, proyectos_options = indice.del_municipio(municipio, filtradas)
+    if not len(posiciones):
+        return [None, "Seleccione", "0", "N/A", "0", "0", "N/A", [], None, [], None]
     
     if trigger_id == 'proyecto-selector.value' and selected_proyecto:
-        proyecto_data = municipio_data[municipio_data['ID'] == selected_proyecto].iloc[0]
+        proyecto_data = datos.df.iloc[posicion]
     else:
-        proyecto_data = municipio_data.iloc[0] if not municipio_data.empty else None
-        selected_proyecto = proyecto_data['ID'] if proyecto_data is not None else None
-    
-    if proyecto_data is None:
-        return [None, "Seleccione", "0", "N/A", "0", "0", "N/A", [], None, [], None]
-    
-    proyectos_options = [{'label': f"Proyecto {row['ID']}", 'value': row['ID']} 
-                        for _, row in municipio_data.iterrows()]
+        proyecto_data = datos.df.iloc[posiciones[0]]
+        selected_proyecto = proyectos_options[0]['value']
     
     foto_data = []
     buttons = []
     if selected_proyecto:
-        for i in [1, 2]:
-            foto_path = f"assets/fotos/Rf {i} proyecto {selected_proyecto}.jpg"
-            if os.path.exists(foto_path):
-                encoded_image = encode_image(foto_path)
-                foto_data.append({
-                    'photo_num': i,
-                    'image': encoded_image
-                })
-                buttons.append(
-                    html.Button(
-                        f"Evidencia {i}",
-                        id={'type': 'photo-button', 'index': i},
-                        n_clicks=0,
-                        style=styles['photo-button']
-                    )
+        # Solo URLs: el navegador descarga la rendición 'pantalla' al abrir el modal
+        for foto in pipeline_fotos.urls(selected_proyecto):
+            i = foto['photo_num']
+            foto_data.append(foto)
+            buttons.append(
+                html.Button(
+                    [html.Img(src=foto['miniatura'], style=styles['photo-thumb']), f"Evidencia {i}"],
+                    id={'type': 'photo-button', 'index': i},
+                    n_clicks=0,
+                    style=styles['photo-button']
                 )
+            )
     
     return [
         municipio, 
@@ -786,6 +1435,7 @@ def handle_selection(clicks, map_click, selected_proyecto, filtered_data, munici
      Input('close-modal', 'n_clicks')],
     [State('photo-store', 'data')]
 )
+@metricas.medir
 def toggle_modal(photo_clicks, close_click, foto_data):
     ctx = callback_context
     if not ctx.triggered:
@@ -809,6 +1459,7 @@ def toggle_modal(photo_clicks, close_click, foto_data):
     [Input({'type': 'photo-button', 'index': ALL}, 'n_clicks')],
     [State('photo-store', 'data')]
 )
+@metricas.medir
 def update_modal_image(photo_clicks, foto_data):
     ctx = callback_context
     if not ctx.triggered or not foto_data:
@@ -819,10 +1470,82 @@ def update_modal_image(photo_clicks, foto_data):
     
     for foto in foto_data:
         if foto['photo_num'] == photo_num:
-            return foto['image']
+            return foto['pantalla']
     
     raise PreventUpdate
 
-# 6. Ejecutar la aplicación
+# 6. Rutas de servicio
+@server.route('/cache/estadisticas')
+def estadisticas_cache():
+    return flask.jsonify(cache_resultados.estadisticas())
+
+@server.route('/filtros/cola')
+def estadisticas_cola_filtros():
+    return flask.jsonify(cola_filtros.estadisticas())
+
+@server.route('/metrics')
+def exportar_metricas():
+    return flask.Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+@server.route('/datos/sin-municipio')
+def proyectos_sin_municipio():
+    return flask.jsonify(recarga_datos.actual.sin_municipio.to_dict('records'))
+
+@server.route('/datos/filas-invalidas')
+def proyectos_filas_invalidas():
+    return flask.jsonify(recarga_datos.actual.filas_invalidas.to_dict('records'))
+
+@server.route('/datos/recarga')
+def estado_recarga():
+    return flask.jsonify(recarga_datos.estadisticas())
+
+@server.route('/proyectos/cercanos')
+def proyectos_cercanos():
+    """Proyectos cuyo municipio tiene el centroide a `km` o menos de (lat, lon)."""
+    try:
+        lat = float(flask.request.args['lat'])
+        lon = float(flask.request.args['lon'])
+        km = float(flask.request.args.get('km', 10))
+    except (KeyError, ValueError):
+        flask.abort(400)
+    datos = recarga_datos.actual
+    posiciones, distancias = indice_espacial.a_distancia(lon, lat, km)
+    distancia = pd.Series(distancias, index=posiciones)
+    cercanos = datos.df.loc[datos.df['pos_municipio'].isin(posiciones), ['ID', 'Municipio', 'pos_municipio']]
+    cercanos = cercanos.assign(distancia_km=distancia.reindex(cercanos['pos_municipio']).round(3).to_numpy())
+    cercanos = cercanos.sort_values('distancia_km', kind='stable').drop(columns='pos_municipio')
+    return flask.jsonify(cercanos.astype({'Municipio': str}).to_dict('records'))
+
+@server.route(app.config.routes_pathname_prefix + 'geo/<nombre>')
+def servir_geojson(nombre):
+    contenido = con_datos_vigentes(lambda: geojson_publicado.get(nombre))
+    if contenido is None:
+        flask.abort(404)
+    respuesta = flask.Response(contenido, mimetype='application/geo+json')
+    respuesta.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    respuesta.set_etag(nombre)
+    return respuesta.make_conditional(flask.request)
+
+@server.route(app.config.routes_pathname_prefix + 'geo/vista/<firma>/<nivel>/<int:z>/<int:x0>/<int:y0>/<int:x1>/<int:y1>.geojson')
+def servir_geojson_vista(firma, nivel, z, x0, y0, x1, y1):
+    if nivel not in capa_geometrias.niveles or z > 22 or x0 > x1 or y0 > y1:
+        flask.abort(404)
+    codigos_mapa = con_datos_vigentes(lambda: codigos_por_firma.get(firma))
+    if codigos_mapa is None:
+        flask.abort(404)
+    contenido = geojson_vista(firma, codigos_mapa, nivel, z, x0, y0, x1, y1)
+    respuesta = flask.Response(contenido, mimetype='application/geo+json')
+    respuesta.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    respuesta.set_etag(f"{firma}-{nivel}-{z}-{x0}-{y0}-{x1}-{y1}")
+    return respuesta.make_conditional(flask.request)
+
+@server.route(app.config.routes_pathname_prefix + 'fotos/<path:nombre>')
+def servir_foto(nombre):
+    # Nombres con hash de contenido: se pueden cachear indefinidamente
+    respuesta = flask.send_from_directory(pipeline_fotos.directorio_destino, nombre, conditional=True, etag=True)
+    respuesta.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return respuesta
+
+# 7. Ejecutar la aplicación
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,169 @@
+/*
+ * Filtrado en el navegador para tablas pequeñas (ver `filtrado_cliente` en app.py).
+ * Replica update_data y update_municipios_list sobre la tabla columnar del Store
+ * 'tabla-cliente', sin ida y vuelta al servidor.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside);
+window.dash_clientside.aip = Object.assign({}, window.dash_clientside.aip, {
+    filtrar: function (tipos, departamentos, comunidades, anos, costos, tabla, figura) {
+        var noActualizar = window.dash_clientside.no_update;
+        if (!tabla) {
+            return [noActualizar, noActualizar, noActualizar, noActualizar, noActualizar, noActualizar, noActualizar];
+        }
+
+        function lista(valores) {
+            return Array.from(new Set(valores || [])).sort();
+        }
+        function rango(valores, minimo, maximo) {
+            var acotados = valores.map(function (v) { return Math.min(Math.max(v, minimo), maximo); });
+            return acotados.sort(function (a, b) { return a - b; });
+        }
+        function mascaraCategoria(columna, valores) {
+            if (!valores.length) {
+                return null;
+            }
+            var categorias = tabla.categorias[columna];
+            var permitidos = new Set();
+            valores.forEach(function (v) {
+                var codigo = categorias.indexOf(v);
+                if (codigo >= 0) {
+                    permitidos.add(codigo);
+                }
+            });
+            return permitidos;
+        }
+
+        // Misma clave canónica que normalizar_filtros en el servidor
+        var filtros = [
+            lista(tipos),
+            lista(departamentos),
+            lista(comunidades),
+            rango(anos, tabla.rango_anos[0], tabla.rango_anos[1]),
+            rango(costos, tabla.rango_costos[0], tabla.rango_costos[1])
+        ];
+        var condiciones = [
+            ['tipo', mascaraCategoria('tipo', filtros[0])],
+            ['departamento', mascaraCategoria('departamento', filtros[1])],
+            ['comunidad', mascaraCategoria('comunidad', filtros[2])]
+        ];
+        var costoMin = filtros[4][0] * 1000000;
+        var costoMax = filtros[4][1] * 1000000;
+
+        var filas = [];
+        for (var i = 0; i < tabla.n; i++) {
+            var ano = tabla.ano[i];
+            var costo = tabla.costo[i];
+            if (ano === null || ano < filtros[3][0] || ano > filtros[3][1]) {
+                continue;
+            }
+            if (costo === null || costo < costoMin || costo > costoMax) {
+                continue;
+            }
+            var cumple = condiciones.every(function (c) {
+                return c[1] === null || c[1].has(tabla[c[0]][i]);
+            });
+            if (cumple) {
+                filas.push(i);
+            }
+        }
+
+        // KPIs
+        var kpis;
+        if (!filas.length) {
+            kpis = ["0", "$0M", "0", "0 ha"];
+        } else {
+            var inversion = 0, beneficiarios = 0, area = 0;
+            filas.forEach(function (f) {
+                inversion += tabla.costo[f] || 0;
+                beneficiarios += tabla.beneficiarios[f] || 0;
+                area += tabla.area[f] || 0;
+            });
+            var formato = function (valor, decimales) {
+                return valor.toLocaleString('en-US', {minimumFractionDigits: decimales, maximumFractionDigits: decimales});
+            };
+            kpis = [filas.length, "$" + formato(inversion / 1000000, 0) + "M", formato(beneficiarios, tabla.decimales_beneficiarios), formato(area, 1) + " ha"];
+        }
+
+        // Lista de municipios (la dibuja aip.tarjetas, igual que en modo servidor)
+        var conteos = {};
+        filas.forEach(function (f) {
+            var municipio = tabla.categorias.municipio[tabla.municipio[f]];
+            conteos[municipio] = (conteos[municipio] || 0) + 1;
+        });
+        var municipios = Object.keys(conteos).sort();
+        var listaMunicipios = municipios.length ? {
+            municipios: municipios,
+            conteos: municipios.map(function (m) { return conteos[m]; })
+        } : null;
+
+        // Mapa: mismas trazas que la figura base, con nuevas ubicaciones y datos de hover
+        var geo = tabla.municipios_geo;
+        var trazas = {};
+        var anotacion = null;
+        var conGeometria = filas.filter(function (f) { return tabla.geo[f] >= 0; });
+        if (!filas.length) {
+            anotacion = "No hay datos con los filtros aplicados";
+        } else if (!conGeometria.length) {
+            anotacion = "No hay datos geográficos";
+        } else if (tabla.modo_mapa === 'agregado') {
+            var grupos = new Map();
+            conGeometria.forEach(function (f) {
+                var g = tabla.geo[f];
+                if (!grupos.has(g)) {
+                    grupos.set(g, {proyectos: 0, inversion: 0, beneficiarios: 0, area: 0, tipos: new Map()});
+                }
+                var grupo = grupos.get(g);
+                var tipo = tabla.categorias.tipo[tabla.tipo[f]];
+                grupo.proyectos += 1;
+                grupo.inversion += tabla.costo[f] || 0;
+                grupo.beneficiarios += tabla.beneficiarios[f] || 0;
+                grupo.area += tabla.area[f] || 0;
+                grupo.tipos.set(tipo, (grupo.tipos.get(tipo) || 0) + 1);
+            });
+            grupos.forEach(function (grupo, g) {
+                // En empate gana el primer tipo encontrado, como en agregar_por_municipio
+                var dominante = null, maximo = -1;
+                grupo.tipos.forEach(function (n, tipo) {
+                    if (n > maximo) {
+                        dominante = tipo;
+                        maximo = n;
+                    }
+                });
+                trazas[dominante] = trazas[dominante] || {locations: [], customdata: []};
+                trazas[dominante].locations.push(geo.codigo[g]);
+                trazas[dominante].customdata.push([
+                    geo.nombre[g], geo.depto[g], dominante, grupo.proyectos,
+                    grupo.inversion / 1000000, grupo.beneficiarios, grupo.area
+                ]);
+            });
+        } else {
+            conGeometria.forEach(function (f) {
+                var g = tabla.geo[f];
+                var tipo = tabla.categorias.tipo[tabla.tipo[f]];
+                trazas[tipo] = trazas[tipo] || {locations: [], customdata: []};
+                trazas[tipo].locations.push(geo.codigo[g]);
+                trazas[tipo].customdata.push([geo.nombre[g], geo.depto[g], tipo, tabla.id[f]]);
+            });
+        }
+
+        var nuevaFigura = Object.assign({}, figura);
+        nuevaFigura.data = figura.data.map(function (traza, i) {
+            if (i >= tabla.tipos_mapa.length) {
+                return traza;
+            }
+            var datos = trazas[tabla.tipos_mapa[i]] || {locations: [], customdata: []};
+            return Object.assign({}, traza, {
+                locations: datos.locations,
+                z: datos.locations.map(function () { return 1; }),
+                customdata: datos.customdata,
+                showlegend: datos.locations.length > 0
+            });
+        });
+        nuevaFigura.layout = Object.assign({}, figura.layout, {
+            annotations: anotacion ? [{text: anotacion, x: 0.5, y: 0.5, showarrow: false, font: {size: 14}}] : []
+        });
+
+        var filteredData = filas.length ? {filtros: filtros, total: filas.length} : null;
+        return [filteredData, kpis[0], kpis[1], kpis[2], kpis[3], nuevaFigura, listaMunicipios];
+    }
+});
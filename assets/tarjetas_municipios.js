@@ -0,0 +1,72 @@
+/*
+ * Tarjetas de municipios paginadas a partir del Store 'municipios-lista'
+ * ({municipios: [...], conteos: [...]}, ordenados por nombre), en ambos modos de filtrado.
+ * Cambiar la selección solo reemplaza las dos tarjetas afectadas.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside);
+window.dash_clientside.aip = Object.assign({}, window.dash_clientside.aip, {
+    tarjetas: function (lista, nMas, seleccionado, config, actuales, vista) {
+        var noActualizar = window.dash_clientside.no_update;
+        var contexto = window.dash_clientside.callback_context;
+        var disparo = contexto.triggered.length ? contexto.triggered[0].prop_id : '';
+        var estilos = config.estilos;
+
+        function div(props) {
+            return {type: 'Div', namespace: 'dash_html_components', props: props};
+        }
+        function tarjeta(i) {
+            var municipio = lista.municipios[i];
+            var conteo = lista.conteos[i];
+            var sufijo = municipio === seleccionado ? '-selected' : '';
+            return div({
+                id: {type: 'municipio-card', index: municipio},
+                n_clicks: 0,
+                style: estilos['municipio-card' + sufijo],
+                children: [
+                    div({children: municipio, style: estilos['municipio-name' + sufijo]}),
+                    div({children: conteo + " proyecto" + (conteo > 1 ? "s" : ""),
+                         style: estilos['municipio-projects' + sufijo]})
+                ]
+            });
+        }
+        function boton(mostrados) {
+            var restantes = lista.municipios.length - mostrados;
+            if (restantes <= 0) {
+                return [estilos['oculto'], ""];
+            }
+            return [estilos['mas-municipios'], "Mostrar más (" + restantes + (restantes > 1 ? " restantes)" : " restante)")];
+        }
+
+        if (!lista || !lista.municipios.length) {
+            var vacio = div({children: "No hay municipios con los filtros actuales", style: estilos['sin-municipios']});
+            return [vacio, {mostrados: 0, resaltado: seleccionado}, estilos['oculto'], ""];
+        }
+
+        var tarjetas, mostrados;
+        if (disparo === 'selected-municipio.data' && vista && Array.isArray(actuales)) {
+            // Solo se redibujan la tarjeta resaltada antes y la nueva
+            tarjetas = actuales.slice();
+            [vista.resaltado, seleccionado].forEach(function (municipio) {
+                var i = lista.municipios.indexOf(municipio);
+                if (i >= 0 && i < tarjetas.length) {
+                    tarjetas[i] = tarjeta(i);
+                }
+            });
+            return [tarjetas, {mostrados: vista.mostrados, resaltado: seleccionado}, noActualizar, noActualizar];
+        }
+        if (disparo === 'mas-municipios.n_clicks' && vista && Array.isArray(actuales)) {
+            mostrados = Math.min(vista.mostrados + config.pagina, lista.municipios.length);
+            tarjetas = actuales.slice();
+            for (var i = vista.mostrados; i < mostrados; i++) {
+                tarjetas.push(tarjeta(i));
+            }
+        } else {
+            mostrados = Math.min(config.pagina, lista.municipios.length);
+            tarjetas = [];
+            for (var j = 0; j < mostrados; j++) {
+                tarjetas.push(tarjeta(j));
+            }
+        }
+        return [tarjetas, {mostrados: mostrados, resaltado: seleccionado}].concat(boton(mostrados));
+    }
+});
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+Latencia, memoria pico y bytes de respuesta de los callbacks del dashboard
+
+Para cada tamaño genera (una vez) una tabla sintética con benchmarks/datos_sinteticos.py,
+construye los artefactos y mide en un proceso nuevo, para que la importación de app.py y
+su estado de módulo sean los de un arranque real. Interacciones medidas:
+
+    carga_inicial        importación de app.py, /_dash-layout y la vista sin filtros
+    arrastre_slider      10 posiciones del slider de años (update_kpis, update_data y lista de municipios)
+    filtro_departamento  el departamento con más proyectos
+    click_mapa           clic en el municipio con más proyectos (handle_selection)
+    abrir_foto           botón de evidencia: modal, imagen y descarga de la rendición
+
+Cada interacción pasa por el cliente de pruebas de Dash ('cliente': enrutado, callback y
+serialización JSON). Los callbacks que no dependen de callback_context también se llaman
+directamente ('directo': solo el cómputo). El filtrado se fuerza al servidor
+(AIP_UMBRAL_CLIENTE=0) y las caches se vacían antes de cada repetición de filtrado.
+
+    python benchmarks/callbacks.py --filas 1000 10000 100000 --salida base.json
+    python benchmarks/callbacks.py --filas 1000 10000 100000 --salida nuevo.json
+    python benchmarks/callbacks.py --comparar base.json nuevo.json
+
+El JSON guarda el commit, la semilla y las versiones: dos corridas con los mismos
+parámetros en la misma máquina son comparables entre commits.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUTA_CALLBACKS = '/_dash-update-component'
+SALIDAS_MAPA = [
+    ('filtered-data', 'data'),
+    ('mapa', 'figure')
+]
+SALIDAS_KPIS = [
+    ('total-proyectos', 'children'),
+    ('total-inversion', 'children'),
+    ('total-beneficiarios', 'children'),
+    ('total-area', 'children')
+]
+SALIDAS_SELECCION = [
+    ('selected-municipio', 'data'),
+    ('municipio-value', 'children'),
+    ('beneficiarios-value', 'children'),
+    ('financiador-value', 'children'),
+    ('duracion-value', 'children'),
+    ('area-value', 'children'),
+    ('producto-value', 'children'),
+    ('proyecto-selector', 'options'),
+    ('proyecto-selector', 'value'),
+    ('photo-buttons', 'children'),
+    ('photo-store', 'data')
+]
+PASOS_SLIDER = 10
+
+
+def _salida(salidas):
+    if len(salidas) == 1:
+        (i, p), = salidas
+        return f"{i}.{p}", {'id': i, 'property': p}
+    return '..' + '...'.join(f"{i}.{p}" for i, p in salidas) + '..', [{'id': i, 'property': p} for i, p in salidas]
+
+
+def cuerpo_filtros(anos, departamentos=None, costos=(0, 7000), cambio='year-slider.value', salidas=SALIDAS_MAPA):
+    output, outputs = _salida(salidas)
+    return {
+        'output': output, 'outputs': outputs,
+        'inputs': [
+            {'id': 'tipo-dropdown', 'property': 'value', 'value': None},
+            {'id': 'departamento-dropdown', 'property': 'value', 'value': departamentos},
+            {'id': 'comunidad-dropdown', 'property': 'value', 'value': None},
+            {'id': 'year-slider', 'property': 'value', 'value': list(anos)},
+            {'id': 'costo-slider', 'property': 'value', 'value': list(costos)}
+        ],
+        'changedPropIds': [cambio],
+        # El callback del mapa recibe el id de pestaña (clave de la cola de filtros)
+        'state': [{'id': 'pestana', 'property': 'data', 'value': 'benchmark'}] if salidas == SALIDAS_MAPA else []
+    }
+
+
+def cuerpo_lista(filtered_data):
+    output, outputs = _salida([('municipios-lista', 'data')])
+    return {
+        'output': output, 'outputs': outputs,
+        'inputs': [{'id': 'filtered-data', 'property': 'data', 'value': filtered_data}],
+        'changedPropIds': ['filtered-data.data'], 'state': []
+    }
+
+
+def cuerpo_seleccion(filtered_data, municipios, cambio, clic_mapa=None, proyecto=None):
+    output, outputs = _salida(SALIDAS_SELECCION)
+    tarjetas = [{'type': 'municipio-card', 'index': m} for m in municipios]
+    return {
+        'output': output, 'outputs': outputs,
+        'inputs': [
+            [{'id': t, 'property': 'n_clicks', 'value': 0} for t in tarjetas],
+            {'id': 'mapa', 'property': 'clickData', 'value': clic_mapa},
+            {'id': 'proyecto-selector', 'property': 'value', 'value': proyecto}
+        ],
+        'state': [
+            {'id': 'filtered-data', 'property': 'data', 'value': filtered_data},
+            [{'id': t, 'property': 'id', 'value': t} for t in tarjetas]
+        ],
+        'changedPropIds': [cambio]
+    }
+
+
+def cuerpo_foto(salida, fotos, numero):
+    output, outputs = _salida([salida])
+    boton = {'type': 'photo-button', 'index': numero}
+    botones = [{'id': {'type': 'photo-button', 'index': f['photo_num']}, 'property': 'n_clicks',
+                'value': 1 if f['photo_num'] == numero else 0} for f in fotos]
+    entradas = [botones]
+    if salida[0] == 'photo-modal':
+        entradas.append({'id': 'close-modal', 'property': 'n_clicks', 'value': 0})
+    return {
+        'output': output, 'outputs': outputs, 'inputs': entradas,
+        'state': [{'id': 'photo-store', 'property': 'data', 'value': fotos}],
+        'changedPropIds': [json.dumps(boton, separators=(',', ':'), sort_keys=True) + '.n_clicks']
+    }
+
+
+def rss_mb():
+    # ru_maxrss está en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(int(round(p / 100 * (len(ordenados) - 1))), len(ordenados) - 1)]
+
+
+def cronometrar(interaccion, repeticiones, preparar=None):
+    """Mediana/p95 de `interaccion()` (devuelve bytes de respuesta) y su pico de memoria Python."""
+    tiempos = []
+    respuesta = 0
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        respuesta = interaccion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    # Pasada aparte con tracemalloc: su sobrecosto no entra en las latencias
+    if preparar:
+        preparar()
+    tracemalloc.start()
+    interaccion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'mediana_ms': round(percentil(tiempos, 50), 3),
+        'p95_ms': round(percentil(tiempos, 95), 3),
+        'min_ms': round(min(tiempos), 3),
+        'bytes': respuesta,
+        'pico_mb': round(pico / 2 ** 20, 3)
+    }
+
+
+def medir(repeticiones):
+    """Se ejecuta en el proceso hijo, con AIP_PROYECTOS apuntando a la tabla sintética."""
+    sys.path.insert(0, RAIZ)
+    os.chdir(RAIZ)
+    inicio = time.perf_counter()
+    import app
+    importar_s = time.perf_counter() - inicio
+    rss_importar = rss_mb()
+
+    cliente = app.server.test_client()
+    datos = app.recarga_datos.actual
+    anos = list(datos.rango_anos)
+
+    def post(cuerpo):
+        respuesta = cliente.post(RUTA_CALLBACKS, json=cuerpo)
+        if respuesta.status_code not in (200, 204):
+            raise RuntimeError(f"{cuerpo['output']}: HTTP {respuesta.status_code}")
+        return respuesta
+
+    def filtrar(*args, **kwargs):
+        # Lo que hace el navegador: KPIs y update_data y, con su resultado, la lista de municipios
+        kpis = post(cuerpo_filtros(*args, salidas=SALIDAS_KPIS, **kwargs))
+        respuesta = post(cuerpo_filtros(*args, **kwargs))
+        filtered_data = respuesta.get_json()['response']['filtered-data']['data']
+        return len(kpis.data) + len(respuesta.data) + len(post(cuerpo_lista(filtered_data)).data)
+
+    def filtrar_directo(*filtros):
+        app.update_kpis(None, filtros[1], None, filtros[0], [0, 7000])
+        resultado = app.update_data(None, filtros[1], None, filtros[0], [0, 7000])
+        app.update_municipios_list(resultado[0])
+        return 0
+
+    def limpiar_caches():
+        app.cache_resultados.limpiar()
+        app.almacen_resultados.limpiar()
+
+    resultados = {}
+    resultados['carga_inicial'] = {
+        'cliente': cronometrar(lambda: len(cliente.get('/_dash-layout').data) + filtrar(anos), repeticiones)
+    }
+
+    posiciones_slider = [[anos[0] + i * (anos[1] - anos[0]) // PASOS_SLIDER, anos[1]] for i in range(PASOS_SLIDER)]
+    resultados['arrastre_slider'] = {
+        'cliente': cronometrar(lambda: sum(filtrar(p) for p in posiciones_slider),
+                               repeticiones, limpiar_caches),
+        'directo': cronometrar(lambda: sum(filtrar_directo(p, None) for p in posiciones_slider),
+                               repeticiones, limpiar_caches)
+    }
+
+    departamento = [str(datos.df['Departamento'].value_counts().index[0])]
+    resultados['filtro_departamento'] = {
+        'cliente': cronometrar(lambda: filtrar(anos, departamento, cambio='departamento-dropdown.value'),
+                               repeticiones, limpiar_caches),
+        'directo': cronometrar(lambda: filtrar_directo(anos, departamento), repeticiones, limpiar_caches)
+    }
+
+    vista = post(cuerpo_filtros(anos)).get_json()['response']
+    filtered_data = vista['filtered-data']['data']
+    municipios = app.update_municipios_list(filtered_data)['municipios']
+    # Clic como lo envía el navegador: punto de la traza de polígonos con el código del municipio
+    con_mapa = datos.df[datos.df['pos_municipio'] >= 0]
+    municipio = str(con_mapa['Municipio'].value_counts().index[0])
+    posicion = con_mapa.loc[con_mapa['Municipio'] == municipio, 'pos_municipio'].iloc[0]
+    codigo = app.nomenclator.codigos[[posicion]].tolist()[0]
+    trazas = {op['location'][1]: op['params']['value'] for op in vista['mapa']['figure']['operations']
+              if op['location'][0] == 'data' and op['location'][2:] == ['locations']}
+    curva = next(i for i, codigos in trazas.items() if codigo in codigos)
+    clic = {'points': [{'curveNumber': curva, 'location': codigo}]}
+    seleccionado = post(cuerpo_seleccion(filtered_data, municipios, 'mapa.clickData', clic_mapa=clic))
+    assert seleccionado.get_json()['response']['municipio-value']['children'] != 'Seleccione', \
+        f"El clic en {municipio} ({codigo}) no selecciona el municipio"
+    resultados['click_mapa'] = {
+        'cliente': cronometrar(lambda: len(post(cuerpo_seleccion(filtered_data, municipios, 'mapa.clickData', clic_mapa=clic)).data),
+                               repeticiones)
+    }
+
+    # Proyecto con evidencia: el ID 1 tiene fotos si se generaron (--fotos)
+    seleccion = post(cuerpo_seleccion(filtered_data, municipios, 'proyecto-selector.value', proyecto=1))
+    fotos = seleccion.get_json()['response']['photo-store']['data'] if seleccion.status_code == 200 else None
+    if fotos:
+        def abrir_foto():
+            modal = post(cuerpo_foto(('photo-modal', 'style'), fotos, fotos[0]['photo_num']))
+            imagen = post(cuerpo_foto(('modal-image', 'src'), fotos, fotos[0]['photo_num']))
+            archivo = cliente.get(imagen.get_json()['response']['modal-image']['src'])
+            return len(modal.data) + len(imagen.data) + len(archivo.data)
+        resultados['abrir_foto'] = {'cliente': cronometrar(abrir_foto, repeticiones)}
+
+    return {
+        'filas': len(datos.df),
+        'municipios': int(datos.df['Municipio'].nunique()),
+        'importar_s': round(importar_s, 3),
+        'rss_tras_importar_mb': round(rss_importar, 1),
+        'rss_max_mb': round(rss_mb(), 1),
+        'interacciones': resultados
+    }
+
+
+def preparar_datos(filas, formato, semilla, directorio, fotos):
+    from datos_sinteticos import generar_fotos, generar_proyectos, guardar_proyectos, municipios_shapefile
+
+    ruta = os.path.join(directorio, f"proyectos-{filas}-s{semilla}.{formato}")
+    if not os.path.exists(ruta):
+        guardar_proyectos(generar_proyectos(filas, municipios_shapefile(), semilla), ruta)
+    directorio_fotos = os.path.join(directorio, 'fotos')
+    generar_fotos(directorio_fotos, range(1, fotos + 1), semilla=semilla)
+    return ruta, directorio_fotos
+
+
+def ejecutar(filas, args):
+    ruta, directorio_fotos = preparar_datos(filas, args.formato, args.semilla, args.directorio, args.fotos)
+    entorno = dict(os.environ, AIP_PROYECTOS=ruta, AIP_FOTOS=directorio_fotos,
+                   AIP_UMBRAL_CLIENTE='0', AIP_INTERVALO_RECARGA='0')
+    # Un arranque previo deja construidos los artefactos y las rendiciones de las fotos,
+    # como tras el paso de build del despliegue: la importación medida es la de un reinicio
+    subprocess.run([sys.executable, '-c', "import app"], cwd=RAIZ, env=entorno, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    proceso = subprocess.run([sys.executable, os.path.abspath(__file__), '--medir', '--repeticiones', str(args.repeticiones)],
+                             cwd=RAIZ, env=entorno, check=True, capture_output=True, text=True)
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def commit_actual():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+        sucio = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=RAIZ,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, sucio
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def imprimir(resultados):
+    print(f"{'filas':>9} {'interacción':<20}{'modo':<9}{'mediana':>11}{'p95':>11}{'pico':>11}{'bytes':>12}")
+    for medida in resultados:
+        for nombre, modos in medida['interacciones'].items():
+            for modo, r in modos.items():
+                print(f"{medida['filas']:>9} {nombre:<20}{modo:<9}{r['mediana_ms']:>8.1f} ms{r['p95_ms']:>8.1f} ms"
+                      f"{r['pico_mb']:>8.1f} MB{r['bytes']:>12,}")
+        print(f"{medida['filas']:>9} {'importar app.py':<20}{'':<9}{medida['importar_s'] * 1000:>8.1f} ms"
+              f"{'':>11}{medida['rss_max_mb']:>8.1f} MB (RSS máx.)")
+
+
+def comparar(ruta_base, ruta_nueva):
+    with open(ruta_base, encoding='utf-8') as archivo:
+        base = json.load(archivo)
+    with open(ruta_nueva, encoding='utf-8') as archivo:
+        nueva = json.load(archivo)
+    if base['parametros'] != nueva['parametros']:
+        print(f"Aviso: parámetros distintos {base['parametros']} / {nueva['parametros']}")
+    print(f"base  {base['commit']}{' (sucio)' if base['sucio'] else ''}")
+    print(f"nueva {nueva['commit']}{' (sucio)' if nueva['sucio'] else ''}")
+    print(f"{'filas':>9} {'interacción':<20}{'modo':<9}{'base':>11}{'nueva':>11}{'razón':>8}{'bytes':>9}{'pico':>9}")
+    previas = {(m['filas'], n, modo): r for m in base['resultados'] for n, modos in m['interacciones'].items() for modo, r in modos.items()}
+    for medida in nueva['resultados']:
+        for nombre, modos in medida['interacciones'].items():
+            for modo, r in modos.items():
+                anterior = previas.get((medida['filas'], nombre, modo))
+                if anterior is None:
+                    continue
+                def razon(clave):
+                    return f"{r[clave] / anterior[clave]:.2f}x" if anterior[clave] else "-"
+                print(f"{medida['filas']:>9} {nombre:<20}{modo:<9}{anterior['mediana_ms']:>8.1f} ms{r['mediana_ms']:>8.1f} ms"
+                      f"{razon('mediana_ms'):>8}{razon('bytes'):>9}{razon('pico_mb'):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filas', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--formato', choices=['xlsx', 'csv', 'parquet'], default='parquet')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--fotos', type=int, default=5, help="proyectos con evidencia fotográfica")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--directorio', default='/tmp/aip-bench', help="datos sintéticos generados")
+    parser.add_argument('--salida', help="JSON con los resultados")
+    parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'NUEVA'))
+    parser.add_argument('--medir', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(args.repeticiones)))
+        return
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    commit, sucio = commit_actual()
+    resultados = [ejecutar(filas, args) for filas in args.filas]
+    informe = {
+        'commit': commit,
+        'sucio': sucio,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'parametros': {k: getattr(args, k) for k in ('formato', 'semilla', 'fotos', 'repeticiones')},
+        'resultados': resultados
+    }
+    imprimir(resultados)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(informe, archivo, indent=2)
+
+
+if __name__ == '__main__':
+    main()
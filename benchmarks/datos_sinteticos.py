@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Tabla de proyectos y evidencia fotográfica sintéticas para los benchmarks
+
+Genera una tabla con las columnas de proyectos.xlsx (ver ingesta.ESQUEMA_PROYECTOS) y
+municipios/departamentos tomados del shapefile, repartidos con una distribución de Zipf
+(pocos municipios concentran muchos proyectos, como en los datos reales). Con la misma
+semilla y número de filas el resultado es idéntico, así que sirve para comparar commits.
+Uso, desde la raíz del repositorio:
+
+    python benchmarks/datos_sinteticos.py --filas 100000 --salida /tmp/aip-bench/proyectos.parquet --fotos 20
+
+El formato sale de la extensión (.xlsx, .csv o .parquet). Escribir y leer .xlsx de más
+de ~100.000 filas lleva minutos (openpyxl); para tablas grandes conviene .parquet.
+"""
+
+import argparse
+import os
+import sys
+
+import geopandas as gpd
+import numpy as np
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datos import shapefile_path  # noqa: E402
+
+TIPOS = ['Ambiental', 'Agropecuario', 'Educación']
+COMUNIDADES = ['Campesino', 'Indígena', 'Afrocolombiano']
+ENTIDADES = ['ADR', 'Coagro', 'FUPAD', 'Mercy Corps', 'ONUDC', 'Unidad de víctimas', 'Caficauca',
+             'Programa Colombia Sostenible']
+PRODUCTOS = ["Establecimiento de {} hectáreas de café", "Transferencia de conocimiento a {} productores",
+             "{} hectáreas de reforestación", "Instalación de {} estufas ecológicas"]
+
+
+def municipios_shapefile(ruta=shapefile_path):
+    """Pares (municipio, departamento) del shapefile, sin leer las geometrías."""
+    municipios = gpd.read_file(ruta, ignore_geometry=True)
+    return municipios[['MpNombre', 'Depto']].drop_duplicates().reset_index(drop=True)
+
+
+def generar_proyectos(filas, municipios, semilla=0):
+    rng = np.random.default_rng(semilla)
+
+    # Zipf sobre un orden aleatorio de municipios
+    pesos = 1 / np.arange(1, len(municipios) + 1) ** 1.1
+    orden = rng.permutation(len(municipios))
+    elegidos = orden[rng.choice(len(municipios), size=filas, p=pesos / pesos.sum())]
+
+    inicio = pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 11 * 365, filas), unit='D')
+    duracion = rng.integers(1, 37, filas)
+    fin = inicio + pd.to_timedelta(duracion * 30, unit='D')
+    # Costos log-normales alrededor de 500 millones, acotados al rango del slider
+    costo = np.clip(rng.lognormal(np.log(5e8), 1.2, filas), 1e7, 6.99e9).astype('int64')
+    directos = rng.integers(10, 5000, filas)
+    entidades = np.array(ENTIDADES, dtype=object)
+    productos = np.array(PRODUCTOS, dtype=object)[rng.integers(0, len(PRODUCTOS), filas)]
+    cantidades = rng.integers(5, 600, filas)
+
+    return pd.DataFrame({
+        'ID': np.arange(1, filas + 1),
+        'Objeto del proyecto': [f"Proyecto sintético {i}" for i in range(1, filas + 1)],
+        'Tipo de proyecto': np.array(TIPOS, dtype=object)[rng.integers(0, len(TIPOS), filas)],
+        'Municipio': municipios['MpNombre'].to_numpy()[elegidos],
+        'Departamento': municipios['Depto'].to_numpy()[elegidos],
+        'Área intervenida (ha)': np.round(rng.lognormal(np.log(150), 1.3, filas), 1),
+        'Beneficiarios directos': directos,
+        'Beneficiarios indirectos': np.where(rng.random(filas) < 0.7, 0, rng.integers(0, 5000, filas)),
+        'Comunidad beneficiaria': np.array(COMUNIDADES, dtype=object)[rng.integers(0, len(COMUNIDADES), filas)],
+        'Entidad contratante': entidades[rng.integers(0, len(entidades), filas)],
+        'Entidad financiadora': entidades[rng.integers(0, len(entidades), filas)],
+        'Fecha inicio': inicio,
+        'Fecha fin': fin,
+        'Duración del proyecto (meses)': duracion.astype(float),
+        'Costo total ($COP)': costo,
+        'Producto principal generado': [p.format(c) for p, c in zip(productos, cantidades)]
+    })
+
+
+def guardar_proyectos(df, ruta):
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == '.parquet':
+        df.to_parquet(ruta, index=False)
+    elif extension == '.csv':
+        df.to_csv(ruta, index=False)
+    elif extension == '.xlsx':
+        # write_only: las filas se escriben en streaming, sin el modelo de celdas en memoria
+        libro = openpyxl.Workbook(write_only=True)
+        hoja = libro.create_sheet()
+        hoja.append(list(df.columns))
+        for fila in df.itertuples(index=False):
+            hoja.append([v.to_pydatetime() if isinstance(v, pd.Timestamp) else v for v in fila])
+        libro.save(ruta)
+    else:
+        raise ValueError(f"Formato no soportado: {ruta}")
+
+
+def generar_fotos(directorio, ids, por_proyecto=2, lado=1600, semilla=0):
+    """`Rf {n} proyecto {ID}.jpg` con ruido y degradado: pesan como fotos reales al comprimir."""
+    from PIL import Image
+
+    os.makedirs(directorio, exist_ok=True)
+    rng = np.random.default_rng(semilla)
+    alto = lado * 3 // 4
+    degradado = np.linspace(0, 180, lado, dtype=np.float32)[None, :, None]
+    for proyecto in ids:
+        for n in range(1, por_proyecto + 1):
+            ruta = os.path.join(directorio, f"Rf {n} proyecto {proyecto}.jpg")
+            if os.path.exists(ruta):
+                continue
+            pixeles = degradado + rng.normal(0, 40, (alto, lado, 3)).astype(np.float32)
+            Image.fromarray(np.clip(pixeles, 0, 255).astype(np.uint8)).save(ruta, 'JPEG', quality=85)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filas', type=int, default=10000)
+    parser.add_argument('--salida', required=True, help=".xlsx, .csv o .parquet")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--fotos', type=int, default=0, help="proyectos (desde el ID 1) con evidencia fotográfica")
+    parser.add_argument('--directorio-fotos', default=None, help="por defecto, 'fotos' junto a --salida")
+    args = parser.parse_args()
+
+    municipios = municipios_shapefile()
+    df = generar_proyectos(args.filas, municipios, args.semilla)
+    guardar_proyectos(df, args.salida)
+    print(f"{args.salida}: {len(df)} proyectos en {df['Municipio'].nunique()} municipios")
+    if args.fotos:
+        directorio = args.directorio_fotos or os.path.join(os.path.dirname(os.path.abspath(args.salida)), 'fotos')
+        generar_fotos(directorio, range(1, args.fotos + 1), semilla=args.semilla)
+        print(f"{directorio}: evidencia de {args.fotos} proyectos")
+
+
+if __name__ == '__main__':
+    main()
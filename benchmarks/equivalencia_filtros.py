@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Equivalencia de MotorFiltros.query y CuboKPIs con el filtrado pandas original
+
+Para combinaciones aleatorias de filtros (tipos, departamentos, comunidades, años y
+costos) compara las filas de `MotorFiltros.query` y los totales de `CuboKPIs.consultar`
+con las máscaras booleanas de pandas que usaba update_data antes de los índices. Uso,
+desde la raíz del repositorio:
+
+    python benchmarks/equivalencia_filtros.py --combinaciones 2000
+    python benchmarks/equivalencia_filtros.py --filas 100000 --semilla 3
+
+Sin --filas usa la tabla de proyectos configurada (AIP_PROYECTOS); con --filas genera una
+sintética con benchmarks/datos_sinteticos.py. Termina con código 1 si alguna combinación
+difiere. Costo y área se suman en float64, como en el cubo, y se comparan con tolerancia:
+el cubo los obtiene por diferencia de sumas prefijas.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filtros import COLUMNAS_CATEGORICAS, CuboKPIs, MotorFiltros  # noqa: E402
+
+# Como el slider de costos de app.py (millones de COP, paso 50)
+RANGO_COSTOS = (0, 7000)
+PASO_COSTOS = 50
+
+
+def cargar_tabla(filas, semilla):
+    """Tabla tipada como la carga el dashboard (ingesta + columnas derivadas de datos.py)."""
+    import datos
+    if filas:
+        from datos_sinteticos import generar_proyectos, guardar_proyectos, municipios_shapefile
+        ruta = os.path.join(tempfile.mkdtemp(prefix='aip-equivalencia-'), 'proyectos.parquet')
+        guardar_proyectos(generar_proyectos(filas, municipios_shapefile(), semilla), ruta)
+        datos.proyectos_path = ruta
+    return datos.leer_proyectos()['proyectos']
+
+
+def filtrar_pandas(df, tipos, departamentos, comunidades, anos, costos):
+    """El filtrado de update_data antes de MotorFiltros."""
+    filtered = df[
+        (df['Fecha inicio'].dt.year >= anos[0]) &
+        (df['Fecha inicio'].dt.year <= anos[1]) &
+        (df['Costo total ($COP)'] >= costos[0]*1000000) &
+        (df['Costo total ($COP)'] <= costos[1]*1000000)
+    ]
+    for columna, valores in zip(COLUMNAS_CATEGORICAS, (tipos, departamentos, comunidades)):
+        if valores:
+            filtered = filtered[filtered[columna].isin(valores)]
+    return filtered
+
+
+def combinacion_aleatoria(rng, opciones, rango_anos):
+    filtros = []
+    for columna in COLUMNAS_CATEGORICAS:
+        valores = opciones[columna]
+        if rng.random() < 0.5 or not valores:
+            filtros.append([])
+        else:
+            cantidad = rng.integers(1, min(3, len(valores)) + 1)
+            filtros.append(rng.choice(valores, size=cantidad, replace=False).tolist())
+    anos = sorted(rng.integers(rango_anos[0], rango_anos[1] + 1, 2).tolist())
+    if rng.random() < 0.2:
+        costos = list(RANGO_COSTOS)
+    else:
+        costos = sorted((rng.integers(RANGO_COSTOS[0], RANGO_COSTOS[1] + 1, 2) // PASO_COSTOS * PASO_COSTOS).tolist())
+    return filtros + [anos, costos]
+
+
+def comparar(df, combinaciones, semilla):
+    """Lista de (filtros, esperado, obtenido) de las combinaciones que difieren."""
+    motor = MotorFiltros(df)
+    cubo = CuboKPIs(df)
+    rng = np.random.default_rng(semilla)
+    opciones = {columna: sorted(df[columna].dropna().unique().tolist()) for columna in COLUMNAS_CATEGORICAS}
+    rango_anos = (int(df['Año inicio'].min()), int(df['Año inicio'].max()))
+
+    diferencias = []
+    for _ in range(combinaciones):
+        filtros = combinacion_aleatoria(rng, opciones, rango_anos)
+        filtered = filtrar_pandas(df, *filtros)
+        esperado = (
+            filtered.index.tolist(),
+            len(filtered),
+            int(filtered['Beneficiarios totales'].sum()),
+            float(filtered['Costo total ($COP)'].astype('float64').sum()),
+            float(filtered['Área intervenida (ha)'].astype('float64').sum())
+        )
+        n, costo, beneficiarios, area = cubo.consultar(*filtros)
+        obtenido = (df.index[motor.query(*filtros)].tolist(), n, int(beneficiarios), float(costo), float(area))
+        if esperado[:3] != obtenido[:3] or not np.allclose(esperado[3:], obtenido[3:], rtol=1e-9, atol=1e-6):
+            diferencias.append((filtros, esperado[1:], obtenido[1:]))
+    return diferencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--combinaciones', type=int, default=1000)
+    parser.add_argument('--filas', type=int, default=0, help="proyectos sintéticos; 0 usa AIP_PROYECTOS")
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    df = cargar_tabla(args.filas, args.semilla)
+    diferencias = comparar(df, args.combinaciones, args.semilla)
+    for filtros, esperado, obtenido in diferencias[:10]:
+        print(f"{filtros}\n  pandas: {esperado}\n  índices: {obtenido}")
+    print(f"{len(df)} proyectos, {args.combinaciones} combinaciones, {len(diferencias)} diferencias")
+    sys.exit(1 if diferencias else 0)
+
+
+if __name__ == '__main__':
+    main()
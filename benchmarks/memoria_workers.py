@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Memoria por worker de gunicorn, con y sin preload_app
+
+Arranca gunicorn con N workers en cada modo, ejecuta una interacción de filtros
+en cada worker y lee PSS/USS de /proc/<pid>/smaps_rollup (solo Linux). PSS reparte
+las páginas compartidas entre los procesos que las usan; USS es la memoria propia
+de cada worker. Uso, desde la raíz del repositorio:
+
+    python benchmarks/memoria_workers.py --workers 4
+
+Medición de referencia: 3 workers, shapefile sintético de 1.100 municipios con
+~3.000 vértices cada uno (53 MB), 3 interacciones por worker, Python 3.11 en Linux:
+
+    modo         workers   PSS/worker   USS/worker   PSS total
+    sin preload        3     351.1 MB     326.8 MB   1053.2 MB
+    preload            3     101.6 MB      23.3 MB    304.9 MB
+
+Con preload cada worker adicional cuesta ~25 MB propios en vez de ~330 MB.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+SALIDAS_MAPA = [
+    ('filtered-data', 'data'),
+    ('mapa', 'figure')
+]
+SALIDAS_KPIS = [
+    ('total-proyectos', 'children'),
+    ('total-inversion', 'children'),
+    ('total-beneficiarios', 'children'),
+    ('total-area', 'children')
+]
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def memoria(pid):
+    valores = {}
+    with open(f"/proc/{pid}/smaps_rollup") as archivo:
+        for linea in archivo:
+            partes = linea.split()
+            if len(partes) >= 3 and partes[-1] == 'kB':
+                valores[partes[0].rstrip(':')] = int(partes[1]) / 1024
+    return {
+        'rss': valores.get('Rss', 0),
+        'pss': valores.get('Pss', 0),
+        'uss': valores.get('Private_Clean', 0) + valores.get('Private_Dirty', 0)
+    }
+
+
+def hijos(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as archivo:
+        return [int(p) for p in archivo.read().split()]
+
+
+def callback(url, salidas, filtros):
+    """POST de un callback de filtros; falla si la respuesta no es 200 con JSON."""
+    tipos, departamentos, comunidades, anos, costos = filtros
+    cuerpo = {
+        'output': '..' + '...'.join(f"{i}.{p}" for i, p in salidas) + '..',
+        'outputs': [{'id': i, 'property': p} for i, p in salidas],
+        'inputs': [
+            {'id': 'tipo-dropdown', 'property': 'value', 'value': tipos},
+            {'id': 'departamento-dropdown', 'property': 'value', 'value': departamentos},
+            {'id': 'comunidad-dropdown', 'property': 'value', 'value': comunidades},
+            {'id': 'year-slider', 'property': 'value', 'value': list(anos)},
+            {'id': 'costo-slider', 'property': 'value', 'value': list(costos)}
+        ],
+        'changedPropIds': ['year-slider.value'],
+        # El callback del mapa recibe el id de pestaña (clave de la cola de filtros)
+        'state': [{'id': 'pestana', 'property': 'data', 'value': 'benchmark'}] if salidas == SALIDAS_MAPA else []
+    }
+    peticion = urllib.request.Request(
+        url + '/_dash-update-component',
+        data=json.dumps(cuerpo).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}
+    )
+    # urlopen ya lanza HTTPError con 4xx/5xx; un 204 (PreventUpdate) tampoco es una medición válida
+    with urllib.request.urlopen(peticion, timeout=120) as respuesta:
+        if respuesta.status != 200:
+            raise RuntimeError(f"{cuerpo['output']}: HTTP {respuesta.status}")
+        return json.loads(respuesta.read())['response']
+
+
+def interaccion(url, anos):
+    # Como el navegador: mapa y filtered-data, y los KPIs con los filtros que devuelve filtered-data
+    mapa = callback(url, SALIDAS_MAPA, [None, None, None, anos, [0, 7000]])
+    filtered_data = mapa['filtered-data']['data']
+    if not filtered_data:
+        raise RuntimeError(f"Sin proyectos para los años {anos}")
+    kpis = callback(url, SALIDAS_KPIS, filtered_data['filtros'])
+    return filtered_data['total'], kpis['total-proyectos']['children']
+
+
+def medir(workers, preload, peticiones):
+    puerto = puerto_libre()
+    # Filtrado en el servidor: con la tabla de ejemplo el modo navegador no registra los callbacks de filtros
+    entorno = dict(os.environ, AIP_PRELOAD='1' if preload else '0', WEB_CONCURRENCY=str(workers),
+                   AIP_UMBRAL_CLIENTE='0')
+    comando = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+               '--bind', f"127.0.0.1:{puerto}", '--workers', str(workers), '--timeout', '600', 'app:server']
+    if preload:
+        comando.append('--preload')
+    proceso = subprocess.Popen(comando, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{puerto}"
+    try:
+        limite = time.time() + 300
+        while True:
+            try:
+                urllib.request.urlopen(url + '/_dash-layout', timeout=5).read()
+                break
+            except OSError:
+                if time.time() > limite or proceso.poll() is not None:
+                    raise RuntimeError("gunicorn no arrancó")
+                time.sleep(0.5)
+        # Varias interacciones por worker (gunicorn reparte las conexiones)
+        for i in range(peticiones * workers):
+            total, proyectos = interaccion(url, [2015 + i % 3, 2025])
+            if total != proyectos:
+                raise RuntimeError(f"KPIs ({proyectos}) distintos de filtered-data ({total})")
+        time.sleep(1)
+        return [memoria(pid) for pid in hijos(proceso.pid)]
+    finally:
+        proceso.send_signal(signal.SIGTERM)
+        proceso.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--peticiones', type=int, default=5, help="interacciones por worker")
+    args = parser.parse_args()
+
+    print(f"{'modo':<12}{'workers':>8}{'PSS/worker':>13}{'USS/worker':>13}{'PSS total':>12}")
+    for preload in (False, True):
+        medidas = medir(args.workers, preload, args.peticiones)
+        pss = sum(m['pss'] for m in medidas)
+        uss = sum(m['uss'] for m in medidas)
+        n = max(len(medidas), 1)
+        modo = 'preload' if preload else 'sin preload'
+        print(f"{modo:<12}{len(medidas):>8}{pss / n:>10.1f} MB{uss / n:>10.1f} MB{pss:>9.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Cache LRU acotada y almacenes de resultados para los callbacks
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class CacheLRU:
+    """Cache LRU con límite de entradas y de bytes.
+
+    Las claves llevan la versión de los datos; al publicar una versión nueva se llama a
+    `limpiar` para liberar las entradas que ya no se pueden pedir.
+    """
+
+    def __init__(self, max_entradas=128, max_bytes=64 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.invalidaciones = 0
+
+    def _vaciar(self):
+        self._datos.clear()
+        self._bytes = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            if clave not in self._datos:
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return self._datos[clave][0]
+
+    def contiene(self, clave):
+        """Si la clave está guardada, sin contar acierto ni fallo."""
+        with self._lock:
+            return clave in self._datos
+
+    def guardar(self, clave, valor, tamano=0):
+        with self._lock:
+            if tamano > self.max_bytes:
+                return
+            if clave in self._datos:
+                self._bytes -= self._datos.pop(clave)[1]
+            self._datos[clave] = (valor, tamano)
+            self._bytes += tamano
+            while len(self._datos) > self.max_entradas or self._bytes > self.max_bytes:
+                _, (_, tamano_desalojado) = self._datos.popitem(last=False)
+                self._bytes -= tamano_desalojado
+                self.desalojos += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._vaciar()
+            self.invalidaciones += 1
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'entradas': len(self._datos),
+                'bytes': self._bytes,
+                'max_entradas': self.max_entradas,
+                'max_bytes': self.max_bytes,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'invalidaciones': self.invalidaciones
+            }
+
+
+class AlmacenDisco:
+    """Almacén de posiciones de fila en disco (.npy), con la misma interfaz que CacheLRU."""
+
+    def __init__(self, directorio, max_archivos=4096):
+        self.directorio = directorio
+        self.max_archivos = max_archivos
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.npy")
+
+    def obtener(self, clave):
+        try:
+            posiciones = np.load(self._ruta(clave), mmap_mode='r')
+        except FileNotFoundError:
+            # Nunca guardado, o recortado por otro worker: se recalcula
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        return posiciones
+
+    def contiene(self, clave):
+        return os.path.exists(self._ruta(clave))
+
+    def guardar(self, clave, valor, tamano=0):
+        with self._lock:
+            # Temporal propio del proceso: otro worker puede guardar la misma clave a la vez
+            temporal = f"{self._ruta(clave)}.{os.getpid()}.tmp"
+            with open(temporal, 'wb') as archivo:
+                np.save(archivo, np.asarray(valor))
+            os.replace(temporal, self._ruta(clave))
+            self._recortar()
+
+    def _archivos(self):
+        return [os.path.join(self.directorio, f) for f in os.listdir(self.directorio) if f.endswith('.npy')]
+
+    @staticmethod
+    def _borrar(ruta):
+        # El directorio es compartido: otro worker pudo borrarlo antes
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+    def _recortar(self):
+        archivos = self._archivos()
+        if len(archivos) > self.max_archivos:
+            fechas = {}
+            for ruta in archivos:
+                try:
+                    fechas[ruta] = os.path.getmtime(ruta)
+                except OSError:
+                    pass
+            antiguos = sorted(fechas, key=fechas.get)
+            for ruta in antiguos[:len(fechas) - self.max_archivos]:
+                self._borrar(ruta)
+
+    def limpiar(self):
+        with self._lock:
+            for ruta in self._archivos():
+                self._borrar(ruta)
+
+    def estadisticas(self):
+        return {
+            'entradas': len(self._archivos()),
+            'aciertos': self.aciertos,
+            'fallos': self.fallos
+        }
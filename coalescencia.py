@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Cola acotada para el cómputo de filtros, con coalescencia por página
+
+Con varios clics seguidos en un dropdown, el navegador envía una petición por valor y
+solo aplica la última respuesta. Aquí, si una petición de la misma clave (pestaña y
+callback) llega mientras la anterior espera turno, la anterior se descarta sin calcular;
+el cómputo corre de a `concurrencia` trabajos en orden de llegada, así que una ráfaga de
+una página ocupa a lo sumo un lugar en la cola y no deja sin turno a las demás.
+
+La clave es por pestaña y no por navegador: dos pestañas del mismo navegador esperan
+cada una su propia respuesta y no deben reemplazarse entre sí.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class Reemplazada(Exception):
+    """Llegó una petición más reciente de la misma clave antes de que esta tuviera turno."""
+
+
+class ColaLlena(Exception):
+    """Hay `max_espera` trabajos esperando: la petición se rechaza en vez de encolarse."""
+
+
+class ColaPorSesion:
+    """Ejecuta trabajos de a `concurrencia`, en orden de llegada y solo el último de cada clave."""
+
+    def __init__(self, concurrencia=1, max_espera=8, tiempo_max=60):
+        self.concurrencia = concurrencia
+        self.max_espera = max_espera
+        self.tiempo_max = tiempo_max
+        self._condicion = threading.Condition()
+        self._activos = 0
+        self._turnos = deque()
+        self._ultimo = {}
+        self.ejecutados = 0
+        self.reemplazados = 0
+        self.rechazados = 0
+
+    def ejecutar(self, sesion, trabajo):
+        """Resultado de `trabajo()`; con `sesion` None corre sin pasar por la cola.
+
+        Sin clave no se sabe qué peticiones se reemplazan entre sí (llamadas directas,
+        clientes que no envían el id de pestaña), así que no se agrupan con ninguna otra.
+        """
+        if sesion is None:
+            resultado = trabajo()
+            with self._condicion:
+                self.ejecutados += 1
+            return resultado
+
+        turno = object()
+        limite = time.monotonic() + self.tiempo_max
+        with self._condicion:
+            anterior = self._ultimo.get(sesion)
+            if anterior is not None and anterior in self._turnos:
+                # La anterior de la clave sale de la cola: su lugar pasa a esta
+                self._turnos.remove(anterior)
+                self.reemplazados += 1
+            elif len(self._turnos) >= self.max_espera:
+                self.rechazados += 1
+                raise ColaLlena()
+            self._ultimo[sesion] = turno
+            self._turnos.append(turno)
+            self._condicion.notify_all()
+
+            while True:
+                if turno not in self._turnos:
+                    raise Reemplazada()
+                if self._activos < self.concurrencia and self._turnos[0] is turno:
+                    self._turnos.popleft()
+                    self._activos += 1
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._turnos.remove(turno)
+                    if self._ultimo.get(sesion) is turno:
+                        del self._ultimo[sesion]
+                    self.rechazados += 1
+                    self._condicion.notify_all()
+                    raise ColaLlena()
+                self._condicion.wait(restante)
+
+        try:
+            return trabajo()
+        finally:
+            with self._condicion:
+                self._activos -= 1
+                self.ejecutados += 1
+                if self._ultimo.get(sesion) is turno:
+                    del self._ultimo[sesion]
+                self._condicion.notify_all()
+
+    def estadisticas(self):
+        with self._condicion:
+            return {
+                'concurrencia': self.concurrencia,
+                'max_espera': self.max_espera,
+                'activos': self._activos,
+                'en_espera': len(self._turnos),
+                'ejecutados': self.ejecutados,
+                'reemplazados': self.reemplazados,
+                'rechazados': self.rechazados
+            }
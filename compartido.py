@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Estructuras de datos amigables con copy-on-write para gunicorn con preload_app
+
+Con preload_app los datos se cargan una vez en el proceso maestro y los workers
+los heredan al hacer fork. Cada objeto Python que un worker toca (aunque sea solo
+para incrementar su contador de referencias) copia su página de memoria, así que
+los datos de larga vida se guardan en pocos buffers grandes en vez de millones de
+objetos: arreglos NumPy, categorías y geometrías en WKB.
+"""
+
+import numpy as np
+from shapely import wkb
+
+
+class GeometriasWKB:
+    """Geometrías serializadas en WKB dentro de un único buffer contiguo."""
+
+    def __init__(self, geometrias):
+        datos = [b'' if g is None or g.is_empty else g.wkb for g in geometrias]
+        self.offsets = np.zeros(len(datos) + 1, dtype=np.int64)
+        np.cumsum([len(d) for d in datos], out=self.offsets[1:])
+        self.buffer = np.frombuffer(b''.join(datos), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, posicion):
+        inicio, fin = self.offsets[posicion], self.offsets[posicion + 1]
+        if inicio == fin:
+            return None
+        return wkb.loads(self.buffer[inicio:fin].tobytes())
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes + self.offsets.nbytes
+
+
+def compactar_columnas(df, max_proporcion_unicos=0.5):
+    """Columnas de texto repetitivas a 'category': códigos NumPy en vez de un str por fila."""
+    for columna in df.columns:
+        serie = df[columna]
+        if serie.dtype == object and serie.nunique(dropna=True) <= max(1, len(serie) * max_proporcion_unicos):
+            df[columna] = serie.astype('category')
+    return df
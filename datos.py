@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Carga de fuentes y caché de artefactos procesados (GeoParquet/Feather) con manifiesto de hashes
+
+Paso de build (p. ej. en el despliegue, antes de arrancar gunicorn):
+
+    python datos.py
+"""
+
+import glob
+import hashlib
+import json
+import os
+import pickle
+
+import geopandas as gpd
+import pandas as pd
+
+from ingesta import leer_proyectos_tipados
+from nomenclator import COLUMNAS_GEOMETRICAS, atributos_geometricos, normalizar_nombre
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # Sin pyarrow los artefactos se guardan con pickle
+    feather = None
+
+shapefile_path = "data/shapefiles/municipio_distrito_y_area_no_municipalizada.shp"
+aip_locations_path = "data/shapefiles/cobertura_trabajo_aip.shp"
+# .xlsx, .csv o .parquet (ver ingesta.py)
+proyectos_path = os.environ.get('AIP_PROYECTOS', "data/proyectos.xlsx")
+directorio_artefactos = "data/cache/artefactos"
+
+# Cambiar al modificar el procesamiento para forzar la reconstrucción
+VERSION_PROCESAMIENTO = 4
+
+
+def componentes_shapefile(ruta):
+    """El .shp y sus archivos hermanos (.dbf, .shx, .prj, .cpg...)."""
+    base, _ = os.path.splitext(ruta)
+    return sorted(glob.glob(glob.escape(base) + '.*'))
+
+
+def hash_archivo(ruta):
+    sha1 = hashlib.sha1()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b''):
+            sha1.update(bloque)
+    return sha1.hexdigest()
+
+
+class CacheArtefactos:
+    """Guarda tablas procesadas junto a un manifiesto con el hash de sus archivos fuente."""
+
+    def __init__(self, directorio=directorio_artefactos):
+        self.directorio = directorio
+
+    def _ruta_manifiesto(self, nombre):
+        return os.path.join(self.directorio, f"{nombre}.json")
+
+    def _leer_manifiesto(self, nombre):
+        try:
+            with open(self._ruta_manifiesto(nombre), encoding='utf-8') as archivo:
+                return json.load(archivo)
+        except (OSError, ValueError):
+            return None
+
+    def firma_fuentes(self, fuentes, anterior=None):
+        """Hash por archivo; reutiliza el del manifiesto anterior si tamaño y mtime no cambiaron."""
+        previas = (anterior or {}).get('fuentes', {})
+        firma = {}
+        for ruta in fuentes:
+            estado = os.stat(ruta)
+            previa = previas.get(ruta)
+            if previa and previa['tamano'] == estado.st_size and previa['mtime_ns'] == estado.st_mtime_ns:
+                firma[ruta] = previa
+            else:
+                firma[ruta] = {'tamano': estado.st_size, 'mtime_ns': estado.st_mtime_ns, 'sha1': hash_archivo(ruta)}
+        return firma
+
+    def _vigente(self, manifiesto, firma):
+        if not manifiesto or manifiesto.get('version') != VERSION_PROCESAMIENTO:
+            return False
+        hashes = {ruta: datos['sha1'] for ruta, datos in firma.items()}
+        previos = {ruta: datos['sha1'] for ruta, datos in manifiesto['fuentes'].items()}
+        if hashes != previos:
+            return False
+        return all(os.path.exists(os.path.join(self.directorio, a)) for a in manifiesto['archivos'].values())
+
+    def _escribir_tabla(self, tabla, ruta_base):
+        if feather is not None and isinstance(tabla, gpd.GeoDataFrame):
+            ruta = ruta_base + '.parquet'
+            tabla.to_parquet(ruta + '.tmp')
+        elif feather is not None and isinstance(tabla, pd.DataFrame):
+            ruta = ruta_base + '.feather'
+            tabla.reset_index(drop=True).to_feather(ruta + '.tmp', compression='uncompressed')
+        else:
+            ruta = ruta_base + '.pkl'
+            with open(ruta + '.tmp', 'wb') as archivo:
+                pickle.dump(tabla, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(ruta + '.tmp', ruta)
+        return os.path.basename(ruta)
+
+    def _leer_tabla(self, archivo):
+        ruta = os.path.join(self.directorio, archivo)
+        if archivo.endswith('.parquet'):
+            return gpd.read_parquet(ruta)
+        if archivo.endswith('.feather'):
+            # Sin compresión: Arrow lee el archivo mapeado en memoria
+            return feather.read_table(ruta, memory_map=True).to_pandas()
+        with open(ruta, 'rb') as archivo_pkl:
+            return pickle.load(archivo_pkl)
+
+    def obtener(self, nombre, fuentes, construir, forzar=False):
+        """Tablas del artefacto `nombre`; llama a `construir()` si las fuentes cambiaron."""
+        manifiesto = self._leer_manifiesto(nombre)
+        firma = self.firma_fuentes(fuentes, manifiesto)
+        if not forzar and self._vigente(manifiesto, firma):
+            try:
+                tablas = {clave: self._leer_tabla(archivo) for clave, archivo in manifiesto['archivos'].items()}
+            except OSError:
+                # Otro worker reconstruyó y borró estos archivos entre `_vigente` y la lectura
+                tablas = None
+            if tablas is not None:
+                if firma != manifiesto['fuentes']:
+                    # Mismo contenido con otro mtime: se actualiza para no volver a calcular hashes
+                    self._escribir_manifiesto(nombre, firma, manifiesto['archivos'])
+                return tablas
+
+        tablas = construir()
+        os.makedirs(self.directorio, exist_ok=True)
+        # Hash de fuentes + pid en el nombre: varios workers pueden reconstruir a la vez
+        sufijo = hashlib.sha1(json.dumps(firma, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        archivos = {
+            clave: self._escribir_tabla(tabla, os.path.join(self.directorio, f"{nombre}-{clave}-{sufijo}-{os.getpid()}"))
+            for clave, tabla in tablas.items()
+        }
+        self._escribir_manifiesto(nombre, firma, archivos)
+        self._limpiar_obsoletos(nombre, archivos)
+        return tablas
+
+    def _escribir_manifiesto(self, nombre, firma, archivos):
+        temporal = self._ruta_manifiesto(nombre) + f'.{os.getpid()}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump({'version': VERSION_PROCESAMIENTO, 'fuentes': firma, 'archivos': archivos}, archivo, indent=2)
+        os.replace(temporal, self._ruta_manifiesto(nombre))
+
+    def _limpiar_obsoletos(self, nombre, vigentes):
+        # Otro worker pudo publicar su manifiesto después del nuestro: sus archivos se conservan,
+        # igual que los escritos después de nuestro manifiesto (una reconstrucción en curso)
+        conservar = set(vigentes.values()) | set((self._leer_manifiesto(nombre) or {}).get('archivos', {}).values())
+        try:
+            publicado = os.stat(self._ruta_manifiesto(nombre)).st_mtime_ns
+        except OSError:
+            return
+        for ruta in glob.glob(os.path.join(glob.escape(self.directorio), f"{nombre}-*")):
+            if os.path.basename(ruta) in conservar or ruta.endswith('.tmp'):
+                continue
+            try:
+                if os.stat(ruta).st_mtime_ns < publicado:
+                    os.remove(ruta)
+            except OSError:
+                pass
+
+
+def procesar_geometrias():
+    """Lee los shapefiles, los lleva a EPSG:4326 y calcula atributos geométricos y códigos."""
+    municipios_gdf = gpd.read_file(shapefile_path)
+    aip_locations_gdf = gpd.read_file(aip_locations_path)
+
+    if municipios_gdf.crs != "EPSG:4326":
+        municipios_gdf = municipios_gdf.to_crs("EPSG:4326")
+    if aip_locations_gdf.crs != "EPSG:4326":
+        aip_locations_gdf = aip_locations_gdf.to_crs("EPSG:4326")
+
+    municipios_gdf[COLUMNAS_GEOMETRICAS] = atributos_geometricos(municipios_gdf)
+
+    municipios_gdf['MpNombre'] = normalizar_nombre(municipios_gdf['MpNombre'])
+    municipios_gdf['Depto'] = normalizar_nombre(municipios_gdf['Depto'])
+
+    # Código estable por municipio para enlazar las figuras con la capa GeoJSON
+    if 'MpCodigo' in municipios_gdf.columns:
+        municipios_gdf['codigo'] = municipios_gdf['MpCodigo'].astype(str).str.strip()
+    else:
+        municipios_gdf['codigo'] = municipios_gdf.index.astype(str)
+
+    return {'municipios': municipios_gdf, 'aip': aip_locations_gdf}
+
+
+def leer_proyectos():
+    df, invalidas = leer_proyectos_tipados(proyectos_path)
+    df['Año inicio'] = df['Fecha inicio'].dt.year.astype('int16')
+    df['Beneficiarios totales'] = df['Beneficiarios directos'] + df['Beneficiarios indirectos']
+    return {'proyectos': df, 'invalidas': invalidas}
+
+
+def cargar_geometrias(forzar=False):
+    fuentes = componentes_shapefile(shapefile_path) + componentes_shapefile(aip_locations_path)
+    tablas = CacheArtefactos().obtener('geometrias', fuentes, procesar_geometrias, forzar)
+    return tablas['municipios'], tablas['aip']
+
+
+def cargar_proyectos(forzar=False):
+    """Tabla de proyectos tipada y el reporte de filas inválidas de la fuente."""
+    tablas = CacheArtefactos().obtener('proyectos', [proyectos_path], leer_proyectos, forzar)
+    return tablas['proyectos'], tablas['invalidas']
+
+
+if __name__ == '__main__':
+    municipios_gdf, aip_locations_gdf = cargar_geometrias(forzar=True)
+    df, invalidas = cargar_proyectos(forzar=True)
+    print(f"Artefactos en {directorio_artefactos}: {len(municipios_gdf)} municipios, "
+          f"{len(aip_locations_gdf)} puntos AIP, {len(df)} proyectos ({len(invalidas)} valores inválidos)")
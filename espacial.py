@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Índice espacial de los polígonos municipales: punto -> municipio y búsquedas por distancia
+"""
+
+import functools
+import warnings
+
+import numpy as np
+import shapely
+from shapely.geometry import Point, box
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+
+RADIO_TIERRA_KM = 6371.0088
+KM_POR_GRADO = 111.32
+# Shapely 2 devuelve índices en STRtree.query; la 1.8 devuelve las geometrías
+SHAPELY_2 = int(shapely.__version__.split('.')[0]) >= 2
+
+
+def distancia_km(lon, lat, lons, lats):
+    """Distancia de gran círculo (haversine) de un punto a arreglos de puntos."""
+    lon, lat, lons, lats = map(np.radians, (lon, lat, lons, lats))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(a))
+
+
+class IndiceEspacial:
+    """STRtree sobre las cajas de los municipios; la prueba exacta usa el polígono en WKB.
+
+    El árbol solo guarda cajas (los límites ya están en el nomenclátor), así que se
+    construye en milisegundos y no duplica las geometrías completas en memoria. Las
+    geometrías de los candidatos se cargan del buffer WKB y se preparan, con una LRU
+    para los municipios consultados con frecuencia.
+    """
+
+    def __init__(self, geometrias, nomenclator, max_preparadas=256):
+        self.geometrias = geometrias
+        self.lon = nomenclator.lon
+        self.lat = nomenclator.lat
+        limites = np.column_stack([nomenclator.minx, nomenclator.miny, nomenclator.maxx, nomenclator.maxy])
+        self._posiciones = np.flatnonzero(np.isfinite(limites).all(axis=1))
+        cajas = [box(*limites[i]) for i in self._posiciones]
+        self._area_caja = (limites[:, 2] - limites[:, 0]) * (limites[:, 3] - limites[:, 1])
+        with warnings.catch_warnings():
+            # Shapely 1.8 avisa del cambio de interfaz de la 2.0 (ver `_candidatos`)
+            warnings.simplefilter('ignore', FutureWarning)
+            self._arbol = STRtree(cajas)
+        self._cajas = cajas
+        self._posicion_caja = {id(caja): posicion for caja, posicion in zip(cajas, self._posiciones.tolist())}
+        self._preparada = functools.lru_cache(maxsize=max_preparadas)(self._preparar)
+
+    def _preparar(self, posicion):
+        geometria = self.geometrias[posicion]
+        return None if geometria is None else prep(geometria)
+
+    def _candidatos(self, geometria):
+        if SHAPELY_2:
+            return self._posiciones[self._arbol.query(geometria)]
+        return np.fromiter((self._posicion_caja[id(caja)] for caja in self._arbol.query(geometria)), dtype=np.int64)
+
+    def municipio_en(self, lon, lat):
+        """Posición del municipio que contiene el punto, o -1."""
+        punto = Point(lon, lat)
+        candidatos = self._candidatos(punto)
+        # Con cajas solapadas se prueba primero la más pequeña (municipios dentro de otros)
+        for posicion in candidatos[np.argsort(self._area_caja[candidatos], kind='stable')]:
+            preparada = self._preparada(int(posicion))
+            if preparada is not None and preparada.covers(punto):
+                return int(posicion)
+        return -1
+
+    def asignar(self, lons, lats):
+        """`municipio_en` para arreglos de puntos; -1 donde ningún polígono los contiene."""
+        return np.fromiter((self.municipio_en(x, y) for x, y in zip(lons, lats)), dtype=np.int64, count=len(lons))
+
+    def en_caja(self, oeste, sur, este, norte):
+        """Posiciones (ordenadas) de los municipios cuya caja corta la ventana."""
+        return np.sort(self._candidatos(box(oeste, sur, este, norte)))
+
+    def a_distancia(self, lon, lat, km):
+        """Posiciones de los municipios con centroide a `km` o menos, y sus distancias, de menor a mayor."""
+        grados_lat = km / KM_POR_GRADO
+        grados_lon = km / (KM_POR_GRADO * max(np.cos(np.radians(lat)), 1e-6))
+        # La caja de un municipio con centroide dentro del radio corta la ventana: el árbol da un superconjunto
+        candidatos = self._candidatos(box(lon - grados_lon, lat - grados_lat, lon + grados_lon, lat + grados_lat))
+        distancias = distancia_km(lon, lat, self.lon[candidatos], self.lat[candidatos])
+        dentro = distancias <= km
+        orden = np.argsort(distancias[dentro], kind='stable')
+        return candidatos[dentro][orden], distancias[dentro][orden]
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de filtros con bitsets precalculados para los callbacks del dashboard
+"""
+
+import numpy as np
+import pandas as pd
+
+COLUMNAS_CATEGORICAS = ['Tipo de proyecto', 'Departamento', 'Comunidad beneficiaria']
+
+
+class MotorFiltros:
+    """Índices construidos una vez por carga de datos; `query` devuelve posiciones de fila."""
+
+    def __init__(self, df):
+        self.n = len(df)
+        self.anos = df['Año inicio'].to_numpy(dtype=float)
+
+        # Índice ordenado por costo para búsquedas de rango con searchsorted
+        costos = df['Costo total ($COP)'].to_numpy(dtype=float)
+        self.orden_costo = np.argsort(costos, kind='stable')
+        self.costos_ordenados = costos[self.orden_costo]
+
+        # Un bitset empaquetado (np.packbits) por valor de cada columna categórica
+        self.bitsets = {}
+        for columna in COLUMNAS_CATEGORICAS:
+            categorias = pd.Categorical(df[columna])
+            codigos = categorias.codes
+            self.bitsets[columna] = {
+                valor: np.packbits(codigos == i)
+                for i, valor in enumerate(categorias.categories)
+            }
+
+    def _bits_categoria(self, columna, valores):
+        bitsets = self.bitsets[columna]
+        seleccion = [bitsets[v] for v in valores if v in bitsets]
+        if not seleccion:
+            return np.zeros((self.n + 7) // 8, dtype=np.uint8)
+        return np.bitwise_or.reduce(seleccion)
+
+    def _bits_costo(self, costos):
+        inicio = np.searchsorted(self.costos_ordenados, costos[0] * 1000000, side='left')
+        fin = np.searchsorted(self.costos_ordenados, costos[1] * 1000000, side='right')
+        mascara = np.zeros(self.n, dtype=bool)
+        mascara[self.orden_costo[inicio:fin]] = True
+        return np.packbits(mascara)
+
+    def query(self, tipos, departamentos, comunidades, anos, costos):
+        """Posiciones (iloc) de las filas que cumplen los filtros; costos en millones de COP."""
+        bits = np.packbits((self.anos >= anos[0]) & (self.anos <= anos[1]))
+        bits &= self._bits_costo(costos)
+
+        for columna, valores in zip(COLUMNAS_CATEGORICAS, (tipos, departamentos, comunidades)):
+            if valores:
+                bits &= self._bits_categoria(columna, valores)
+
+        return np.flatnonzero(np.unpackbits(bits, count=self.n))
+
+
+class CuboKPIs:
+    """Totales de los KPIs por celda año × tipo × departamento × comunidad.
+
+    Dentro de cada celda las filas van ordenadas por costo y se guardan sumas prefijas, así
+    un rango de costos se resuelve con dos searchsorted por celda y `consultar` no toca las
+    filas. Da los mismos totales que sumar las filas de `MotorFiltros.query`.
+    """
+
+    def __init__(self, df, columnas_suma=('Costo total ($COP)', 'Beneficiarios totales', 'Área intervenida (ha)')):
+        anos = df['Año inicio'].to_numpy(dtype=float)
+        costos = df['Costo total ($COP)'].to_numpy(dtype=float)
+        # Sin año o sin costo una fila nunca pasa los filtros de rango
+        validas = ~np.isnan(anos) & ~np.isnan(costos)
+
+        # Código de celda en base mixta; el 0 de cada categoría es "sin valor"
+        anos_unicos, celda = np.unique(anos[validas], return_inverse=True)
+        celda = celda.astype(np.int64)
+        self.categorias = {}
+        for columna in COLUMNAS_CATEGORICAS:
+            categorias = pd.Categorical(df[columna])
+            self.categorias[columna] = {valor: i + 1 for i, valor in enumerate(categorias.categories)}
+            celda = celda * (len(categorias.categories) + 1) + categorias.codes[validas].astype(np.int64) + 1
+        codigos_celda, celda = np.unique(celda, return_inverse=True)
+
+        # Se decodifica cada celda existente en sus cuatro coordenadas
+        self.codigos_celda = []
+        for columna in reversed(COLUMNAS_CATEGORICAS):
+            base = len(self.categorias[columna]) + 1
+            self.codigos_celda.insert(0, codigos_celda % base)
+            codigos_celda = codigos_celda // base
+        self.ano_celda = anos_unicos[codigos_celda]
+
+        # Costos como rango entero entre los valores distintos: claves exactas en int64
+        self.costos_unicos = np.unique(costos[validas])
+        self.base_costo = len(self.costos_unicos) + 1
+        claves = celda.astype(np.int64) * self.base_costo + np.searchsorted(self.costos_unicos, costos[validas])
+        orden = np.argsort(claves, kind='stable')
+        self.claves = claves[orden]
+
+        self.prefijos = []
+        for columna in columnas_suma:
+            valores = df[columna].to_numpy()[validas][orden]
+            if np.issubdtype(valores.dtype, np.integer):
+                valores = valores.astype(np.int64)
+            else:
+                # Como pandas.Series.sum: los NaN no suman
+                valores = np.nan_to_num(valores.astype(np.float64))
+            self.prefijos.append(np.concatenate([np.zeros(1, dtype=valores.dtype), np.cumsum(valores)]))
+
+    def consultar(self, tipos, departamentos, comunidades, anos, costos):
+        """Número de filas y suma de cada columna de `columnas_suma`; costos en millones de COP."""
+        seleccion = (self.ano_celda >= anos[0]) & (self.ano_celda <= anos[1])
+        for columna, codigos, valores in zip(COLUMNAS_CATEGORICAS, self.codigos_celda, (tipos, departamentos, comunidades)):
+            if valores:
+                categorias = self.categorias[columna]
+                permitidos = np.zeros(len(categorias) + 1, dtype=bool)
+                permitidos[[categorias[v] for v in valores if v in categorias]] = True
+                seleccion &= permitidos[codigos]
+        celdas = np.flatnonzero(seleccion) * self.base_costo
+
+        desde = np.searchsorted(self.costos_unicos, costos[0] * 1000000, side='left')
+        hasta = np.searchsorted(self.costos_unicos, costos[1] * 1000000, side='right')
+        inicio = np.searchsorted(self.claves, celdas + desde)
+        fin = np.searchsorted(self.claves, celdas + hasta)
+        return (int((fin - inicio).sum()), *((prefijo[fin] - prefijo[inicio]).sum() for prefijo in self.prefijos))
+
+
+class IndiceProyectos:
+    """Posiciones de fila por ID y por municipio, y opciones del selector de proyectos precalculadas."""
+
+    def __init__(self, df, columna_id='ID', columna_municipio='Municipio'):
+        ids = df[columna_id].to_numpy()
+        self.por_id = {}
+        for posicion, valor in enumerate(ids.tolist()):
+            self.por_id.setdefault(valor, posicion)
+
+        # Un solo argsort agrupa las filas de cada municipio (estable: en el orden de la tabla)
+        municipios = pd.Categorical(df[columna_municipio])
+        orden = np.argsort(municipios.codes, kind='stable')
+        cortes = np.searchsorted(municipios.codes[orden], np.arange(len(municipios.categories) + 1))
+        self.por_municipio = {}
+        self.opciones = {}
+        for i, municipio in enumerate(municipios.categories):
+            posiciones = orden[cortes[i]:cortes[i + 1]]
+            if len(posiciones):
+                self.por_municipio[municipio] = posiciones
+                self.opciones[municipio] = [
+                    {'label': f"Proyecto {valor}", 'value': valor} for valor in ids[posiciones].tolist()
+                ]
+
+    @staticmethod
+    def _en(posiciones, filtradas):
+        """Máscara de `posiciones` contenidas en `filtradas` (ordenadas, como las devuelve `query`)."""
+        if not len(filtradas):
+            return np.zeros(len(posiciones), dtype=bool)
+        indices = np.minimum(np.searchsorted(filtradas, posiciones), len(filtradas) - 1)
+        return filtradas[indices] == posiciones
+
+    def posicion_id(self, valor, filtradas=None):
+        """Posición de fila del proyecto, o None si no existe o no está entre `filtradas`."""
+        posicion = self.por_id.get(valor)
+        if posicion is None or (filtradas is not None and not self._en(np.array([posicion]), filtradas)[0]):
+            return None
+        return posicion
+
+    def del_municipio(self, municipio, filtradas):
+        """Posiciones de los proyectos del municipio que cumplen el filtro y sus opciones del selector."""
+        posiciones = self.por_municipio.get(municipio)
+        if posiciones is None:
+            return np.empty(0, dtype=np.int64), []
+        mascara = self._en(posiciones, filtradas)
+        opciones = self.opciones[municipio]
+        return posiciones[mascara], [opciones[i] for i in np.flatnonzero(mascara)]
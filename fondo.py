@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Callbacks pesados en procesos locales (callbacks en segundo plano de Dash con diskcache)
+
+El callback corre en un proceso hijo del worker (fork: hereda los datos ya cargados) y el
+resultado vuelve al navegador por un diskcache en disco, sin Redis ni Celery. Mientras
+tanto los hilos del worker quedan libres para los callbacks ligeros. Requiere
+`pip install "dash[diskcache]"` (diskcache, multiprocess, psutil); sin esos paquetes los
+callbacks corren en el propio worker.
+"""
+
+import contextlib
+import fcntl
+import os
+import time
+
+from dash import DiskcacheManager
+
+try:
+    import diskcache
+    import multiprocess  # noqa: F401 (procesos de DiskcacheManager)
+    import psutil  # noqa: F401 (cancelación de trabajos reemplazados)
+except ImportError:  # Sin dash[diskcache] no hay callbacks en segundo plano
+    diskcache = None
+
+
+def crear_gestor(directorio, cache_by=None, expira=600, max_mb=256):
+    """DiskcacheManager sobre `directorio`, o None si faltan las dependencias.
+
+    Con `cache_by` los resultados quedan en el diskcache (compartido por los workers) y una
+    petición con las mismas entradas no vuelve a calcular.
+    """
+    if diskcache is None:
+        return None
+    cache = diskcache.Cache(directorio, size_limit=max_mb * 1024 * 1024)
+    return DiskcacheManager(cache, cache_by=cache_by, expire=expira)
+
+
+class CuposProceso:
+    """Como mucho `cupos` procesos a la vez, también entre workers: un flock por cupo.
+
+    El kernel suelta el flock cuando el proceso termina, incluso si Dash lo mata porque
+    llegó una petición más nueva, así que un cupo nunca queda tomado.
+    """
+
+    def __init__(self, directorio, cupos=2):
+        os.makedirs(directorio, exist_ok=True)
+        self.rutas = [os.path.join(directorio, f"cupo-{i}.lock") for i in range(cupos)]
+
+    def _tomar(self):
+        for ruta in self.rutas:
+            descriptor = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return descriptor
+            except BlockingIOError:
+                os.close(descriptor)
+        return None
+
+    @contextlib.contextmanager
+    def ocupar(self, al_esperar=None, espera=0.05):
+        descriptor = self._tomar()
+        if descriptor is None and al_esperar is not None:
+            al_esperar()
+        while descriptor is None:
+            time.sleep(espera)
+            descriptor = self._tomar()
+        try:
+            yield
+        finally:
+            # Cerrar el descriptor suelta el flock
+            os.close(descriptor)
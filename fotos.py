@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Rendiciones redimensionadas de la evidencia fotográfica, con nombres por hash de contenido
+"""
+
+import hashlib
+import os
+import re
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Sin Pillow se sirven los originales
+    Image = None
+
+# Lado mayor (px) de cada rendición
+RENDICIONES = {
+    'miniatura': 240,
+    'pantalla': 1280
+}
+CALIDAD_JPEG = 80
+
+PATRON_FOTO = re.compile(r'^Rf (\d+) proyecto (\d+)\.jpe?g$', re.IGNORECASE)
+
+
+def _hash_archivo(ruta):
+    sha1 = hashlib.sha1()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 16), b''):
+            sha1.update(bloque)
+    return sha1.hexdigest()[:16]
+
+
+def _temporal(destino):
+    # Con el pid: varios workers pueden generar la misma rendición al arrancar
+    return f"{destino}.{os.getpid()}.tmp"
+
+
+def _generar_rendicion(origen, destino, lado_max, calidad=CALIDAD_JPEG):
+    temporal = _temporal(destino)
+    with Image.open(origen) as imagen:
+        imagen = ImageOps.exif_transpose(imagen).convert('RGB')
+        imagen.thumbnail((lado_max, lado_max))
+        imagen.save(temporal, 'JPEG', quality=calidad, optimize=True, progressive=True)
+    os.replace(temporal, destino)
+
+
+def rendiciones_altura(origen, directorio_destino, alto, escalas=(1, 2, 3)):
+    """WebP y PNG de `origen` para mostrarse a `alto` px CSS, una por densidad de pantalla.
+
+    Devuelve {'ancho', 'alto', 'webp': [(archivo, escala)], 'png': [...]}, o None sin Pillow.
+    Las escalas que superan el tamaño original se omiten (no se amplía la imagen).
+    """
+    if Image is None:
+        return None
+    os.makedirs(directorio_destino, exist_ok=True)
+    contenido = _hash_archivo(origen)
+    with Image.open(origen) as imagen:
+        imagen = ImageOps.exif_transpose(imagen)
+        imagen = imagen.convert('RGBA' if 'A' in imagen.getbands() or 'transparency' in imagen.info else 'RGB')
+        ancho = round(imagen.width * alto / imagen.height)
+        resultado = {'ancho': ancho, 'alto': alto, 'webp': [], 'png': []}
+        for escala in escalas:
+            if escala > 1 and alto * escala > imagen.height:
+                break
+            tamano = (round(ancho * escala), alto * escala)
+            for formato, opciones in [('webp', {'quality': 85, 'method': 6}), ('png', {'optimize': True})]:
+                archivo = f"{contenido}-{tamano[1]}h.{formato}"
+                destino = os.path.join(directorio_destino, archivo)
+                if not os.path.exists(destino):
+                    temporal = _temporal(destino)
+                    imagen.resize(tamano, Image.LANCZOS).save(temporal, formato.upper(), **opciones)
+                    os.replace(temporal, destino)
+                resultado[formato].append((archivo, escala))
+    return resultado
+
+
+class PipelineFotos:
+    """Indexa `Rf {n} proyecto {ID}.jpg` y genera sus rendiciones una sola vez."""
+
+    def __init__(self, directorio_origen, directorio_destino, url_base='/fotos/', rendiciones=None,
+                 calidad=CALIDAD_JPEG):
+        self.directorio_origen = directorio_origen
+        self.directorio_destino = directorio_destino
+        self.url_base = url_base
+        self.rendiciones = dict(rendiciones or RENDICIONES)
+        self.calidad = calidad
+        self.indice = {}
+
+    def procesar(self):
+        """Genera las rendiciones que falten y reconstruye el índice proyecto -> {n: archivos}."""
+        os.makedirs(self.directorio_destino, exist_ok=True)
+        indice = {}
+        if not os.path.isdir(self.directorio_origen):
+            self.indice = indice
+            return indice
+
+        for nombre in sorted(os.listdir(self.directorio_origen)):
+            coincidencia = PATRON_FOTO.match(nombre)
+            if not coincidencia:
+                continue
+            numero, proyecto = int(coincidencia.group(1)), int(coincidencia.group(2))
+            origen = os.path.join(self.directorio_origen, nombre)
+            contenido = _hash_archivo(origen)
+
+            archivos = {}
+            for rendicion, lado_max in self.rendiciones.items():
+                if Image is None:
+                    archivo = f"{contenido}-original.jpg"
+                    destino = os.path.join(self.directorio_destino, archivo)
+                    if not os.path.exists(destino):
+                        temporal = _temporal(destino)
+                        with open(origen, 'rb') as entrada, open(temporal, 'wb') as salida:
+                            salida.write(entrada.read())
+                        os.replace(temporal, destino)
+                else:
+                    # Lado y calidad en el nombre: al cambiarlos cambian las URLs y no se sirven
+                    # rendiciones viejas desde la caché inmutable del navegador
+                    archivo = f"{contenido}-{rendicion}-{lado_max}px-q{self.calidad}.jpg"
+                    destino = os.path.join(self.directorio_destino, archivo)
+                    if not os.path.exists(destino):
+                        _generar_rendicion(origen, destino, lado_max, self.calidad)
+                archivos[rendicion] = archivo
+            indice.setdefault(proyecto, {})[numero] = archivos
+
+        self.indice = indice
+        return indice
+
+    def urls(self, proyecto):
+        """Lista de {'photo_num', rendición: url} para un proyecto, ordenada por número de foto."""
+        fotos = []
+        for numero, archivos in sorted(self.indice.get(int(proyecto), {}).items()):
+            foto = {'photo_num': numero}
+            foto.update({rendicion: self.url_base + archivo for rendicion, archivo in archivos.items()})
+            fotos.append(foto)
+        return fotos
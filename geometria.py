@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Capa de geometrías municipales precalculada al arranque
+"""
+
+import json
+import math
+
+import numpy as np
+from shapely.geometry import MultiPolygon, Polygon
+
+# Tolerancias de simplificación (grados) por nivel de zoom
+TOLERANCIAS = {
+    'nacional': 0.01,
+    'regional': 0.003,
+    'local': 0.0008
+}
+
+# Zoom desde el que se usa cada nivel: la tolerancia queda por debajo de ~1 píxel
+# (un píxel mide 360 / (256 · 2^zoom) grados en el ecuador)
+ZOOM_NIVELES = {
+    'nacional': 0,
+    'regional': 7,
+    'local': 9
+}
+
+# 4 decimales ~ 11 m en el ecuador, suficiente para el mapa
+DECIMALES = 4
+LATITUD_MAX_MERCATOR = 85.0511
+
+
+def nivel_para_zoom(zoom, niveles=ZOOM_NIVELES):
+    """Nivel de detalle de mayor zoom mínimo que no supera `zoom`."""
+    return max((minimo, nivel) for nivel, minimo in niveles.items() if zoom >= minimo)[1]
+
+
+def ventana_mapa(relayout, ancho_px=800, alto_px=400):
+    """(oeste, sur, este, norte) visibles según el relayoutData de un mapa mapbox, o None."""
+    esquinas = (relayout.get('mapbox._derived') or {}).get('coordinates')
+    if esquinas:
+        lons, lats = zip(*esquinas)
+        return min(lons), min(lats), max(lons), max(lats)
+    centro = relayout.get('mapbox.center')
+    if not centro or 'mapbox.zoom' not in relayout:
+        return None
+    # Sin esquinas (versiones viejas de plotly.js): se estiman con el tamaño típico del mapa
+    grados = 360 / (256 * 2 ** relayout['mapbox.zoom'])
+    medio_lon = ancho_px / 2 * grados
+    medio_lat = alto_px / 2 * grados * math.cos(math.radians(centro['lat']))
+    return centro['lon'] - medio_lon, centro['lat'] - medio_lat, centro['lon'] + medio_lon, centro['lat'] + medio_lat
+
+
+def teselas_ventana(oeste, sur, este, norte, zoom):
+    """Rango de teselas web-mercator (z, x0, y0, x1, y1) que cubre la ventana.
+
+    Ajustar la ventana a teselas hace que vistas parecidas pidan la misma URL (y la misma
+    entrada de cache) en vez de una por cada desplazamiento del mapa.
+    """
+    z = max(0, int(zoom))
+    n = 2 ** z
+
+    def x(lon):
+        return min(max(int((lon + 180) / 360 * n), 0), n - 1)
+
+    def y(lat):
+        lat = math.radians(min(max(lat, -LATITUD_MAX_MERCATOR), LATITUD_MAX_MERCATOR))
+        return min(max(int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n), 0), n - 1)
+
+    return z, x(oeste), y(norte), x(este), y(sur)
+
+
+def limites_teselas(z, x0, y0, x1, y1):
+    """(oeste, sur, este, norte) del rango de teselas, inclusive."""
+    n = 2 ** z
+
+    def lon(x):
+        return x / n * 360 - 180
+
+    def lat(y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+    return lon(x0), lat(y1 + 1), lon(x1 + 1), lat(y0)
+
+
+def _cuantizar_anillo(coords, decimales):
+    puntos = np.round(np.asarray(coords)[:, :2], decimales)
+    # Elimina vértices consecutivos que colapsan al redondear
+    cambios = np.any(np.diff(puntos, axis=0) != 0, axis=1)
+    puntos = np.vstack([puntos[:1], puntos[1:][cambios]])
+    if len(puntos) < 4:
+        return None
+    if not np.array_equal(puntos[0], puntos[-1]):
+        puntos = np.vstack([puntos, puntos[:1]])
+    return puntos.tolist()
+
+
+def _poligono_a_coordenadas(poligono, decimales):
+    exterior = _cuantizar_anillo(poligono.exterior.coords, decimales)
+    if exterior is None:
+        return None
+    interiores = [_cuantizar_anillo(anillo.coords, decimales) for anillo in poligono.interiors]
+    return [exterior] + [anillo for anillo in interiores if anillo is not None]
+
+
+def geometria_a_geojson(geometria, decimales=DECIMALES):
+    """Convierte un (Multi)Polygon de shapely a geometría GeoJSON cuantizada."""
+    if geometria is None or geometria.is_empty:
+        return None
+    if isinstance(geometria, Polygon):
+        poligonos = [geometria]
+    elif isinstance(geometria, MultiPolygon):
+        poligonos = list(geometria.geoms)
+    else:
+        return None
+
+    partes = [p for p in (_poligono_a_coordenadas(pol, decimales) for pol in poligonos) if p is not None]
+    if not partes:
+        return None
+    if len(partes) == 1:
+        return {'type': 'Polygon', 'coordinates': partes[0]}
+    return {'type': 'MultiPolygon', 'coordinates': partes}
+
+
+class CapaGeometrias:
+    """FeatureCollections simplificadas por nivel de zoom, indexadas por código de municipio.
+
+    Cada feature se guarda ya serializada (bytes JSON): un solo objeto por feature
+    en vez de miles de listas y floats, que los workers comparten sin copiarlos.
+    """
+
+    def __init__(self, gdf, columna_codigo='codigo', tolerancias=None, decimales=DECIMALES):
+        self.tolerancias = dict(tolerancias or TOLERANCIAS)
+        self.decimales = decimales
+        self.features = {}
+
+        codigos = gdf[columna_codigo].tolist()
+        # De la tolerancia menor a la mayor: cada nivel se simplifica a partir del anterior,
+        # con muchos menos vértices que la geometría original
+        simplificadas = gdf.geometry
+        for nivel, tolerancia in sorted(self.tolerancias.items(), key=lambda item: item[1]):
+            simplificadas = simplificadas.simplify(tolerancia, preserve_topology=True)
+            features = {}
+            for codigo, geometria in zip(codigos, simplificadas):
+                geojson = geometria_a_geojson(geometria, decimales)
+                if geojson is not None:
+                    feature = {'type': 'Feature', 'id': codigo, 'properties': {}, 'geometry': geojson}
+                    features[codigo] = json.dumps(feature, separators=(',', ':')).encode('utf-8')
+            self.features[nivel] = features
+
+    @property
+    def niveles(self):
+        return list(self.tolerancias)
+
+    def geojson_bytes(self, nivel='nacional', codigos=None):
+        """FeatureCollection serializada del nivel pedido; si se dan códigos, solo esas features."""
+        features = self.features[nivel]
+        if codigos is None:
+            seleccion = features.values()
+        else:
+            seleccion = [features[c] for c in dict.fromkeys(codigos) if c in features]
+        return b'{"type":"FeatureCollection","features":[' + b','.join(seleccion) + b']}'
@@ -1,4 +1,22 @@
-bind = "0.0.0.0:10000"
-workers = 1  # Reduce a 1 worker si tienes límite de memoria
-threads = 2
-timeout = 120
+import gc
+import multiprocessing
+import os
+
+bind = "0.0.0.0:10000"
+
+# Modo multi-worker (AIP_PRELOAD=1): los datos se cargan una vez en el proceso maestro
+# y los workers los comparten por copy-on-write (~25 MB propios por worker en vez de ~330 MB;
+# medición en benchmarks/memoria_workers.py)
+preload_app = os.environ.get('AIP_PRELOAD') == '1'
+if preload_app:
+    workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+else:
+    workers = 1  # Reduce a 1 worker si tienes límite de memoria
+threads = 2
+timeout = 120
+
+
+def when_ready(server):
+    # Congela los objetos ya cargados: el GC de cada worker no los recorre ni copia sus páginas
+    if preload_app:
+        gc.freeze()
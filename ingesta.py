@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Lectura de la tabla de proyectos con esquema explícito y tipos compactos
+
+Fuentes admitidas según la extensión: .xlsx (openpyxl en modo solo lectura, fila a fila),
+.csv y .parquet. Solo se leen las columnas del esquema; las filas que no cumplen las
+columnas obligatorias se descartan y se reportan.
+"""
+
+import os
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from nomenclator import normalizar_nombre
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Las fuentes .parquet requieren pyarrow
+    pq = None
+
+# columna: (tipo, obligatoria). Tipos: 'int32', 'int64', 'float32', 'float64', 'fecha',
+# 'categoria', 'nombre' (categoría normalizada como en el shapefile) y 'texto'
+ESQUEMA_PROYECTOS = {
+    'ID': ('int32', True),
+    'Tipo de proyecto': ('categoria', True),
+    'Municipio': ('nombre', True),
+    'Departamento': ('nombre', True),
+    'Comunidad beneficiaria': ('categoria', False),
+    'Fecha inicio': ('fecha', True),
+    'Fecha fin': ('fecha', False),
+    # Puede traer centavos; float64 es exacto para enteros hasta 2^53 (~9e15 COP)
+    'Costo total ($COP)': ('float64', True),
+    'Beneficiarios directos': ('int32', False),
+    'Beneficiarios indirectos': ('int32', False),
+    'Área intervenida (ha)': ('float32', False),
+    'Duración del proyecto (meses)': ('float32', False),
+    'Entidad contratante': ('categoria', False),
+    'Entidad financiadora': ('categoria', False),
+    'Objeto del proyecto': ('texto', False),
+    'Producto principal generado': ('texto', False)
+}
+
+COLUMNAS_REPORTE = ['fila', 'ID', 'columna', 'valor', 'motivo', 'descartada']
+TIPOS_ENTEROS = ('int32', 'int64')
+TIPOS_NUMERICOS = TIPOS_ENTEROS + ('float32', 'float64')
+
+
+class ErrorEsquema(ValueError):
+    """La fuente no tiene las columnas obligatorias del esquema."""
+
+
+def _leer_xlsx(ruta, columnas):
+    """Solo las columnas pedidas, fila a fila, sin cargar el libro completo en memoria."""
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        encabezado = [str(c).strip() if c is not None else None for c in next(filas, ())]
+        indices = {c: i for i, c in enumerate(encabezado) if c in columnas}
+        valores = {c: [] for c in indices}
+        numeros = []
+        for numero, fila in enumerate(filas, start=2):
+            if fila is None or all(v is None for v in fila):
+                continue
+            numeros.append(numero)
+            for columna, i in indices.items():
+                valores[columna].append(fila[i] if i < len(fila) else None)
+        return pd.DataFrame(valores, index=numeros, dtype=object)
+    finally:
+        libro.close()
+
+
+def leer_fuente(ruta, columnas):
+    """Columnas crudas (sin inferir tipos) de un .xlsx, .csv o .parquet.
+
+    El índice es el número de fila en la fuente, con el encabezado en la fila 1.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return _leer_xlsx(ruta, columnas)
+    if extension == '.csv':
+        crudo = pd.read_csv(ruta, usecols=lambda c: c.strip() in columnas, dtype=str, keep_default_na=False,
+                            na_values=['']).rename(columns=str.strip)
+    elif extension == '.parquet':
+        disponibles = pq.read_schema(ruta).names
+        crudo = pd.read_parquet(ruta, columns=[c for c in disponibles if c in columnas])
+    else:
+        raise ValueError(f"Formato de proyectos no soportado: {ruta}")
+    crudo.index = crudo.index + 2
+    return crudo
+
+
+def _convertir(serie, tipo):
+    """Serie convertida al tipo del esquema y máscara de valores presentes pero inválidos."""
+    vacios = serie.isna() | (serie.astype(str).str.strip() == '')
+    if tipo in TIPOS_NUMERICOS:
+        numeros = pd.to_numeric(serie.where(~vacios), errors='coerce')
+        invalidos = numeros.isna() & ~vacios
+        if tipo in TIPOS_ENTEROS:
+            # Un entero con decimales tampoco es válido (p. ej. "12.5" beneficiarios)
+            invalidos |= numeros.notna() & (numeros % 1 != 0)
+            numeros = numeros.where(~invalidos)
+        return numeros, invalidos
+    if tipo == 'fecha':
+        fechas = pd.to_datetime(serie.where(~vacios), errors='coerce')
+        return fechas, fechas.isna() & ~vacios
+    texto = serie.where(~vacios)
+    return texto.astype(object).where(texto.notna(), None), pd.Series(False, index=serie.index)
+
+
+def _como_texto(serie):
+    return serie.astype(str).where(serie.notna(), None).to_numpy()
+
+
+def _categoria(serie, normalizar=False):
+    """Categoría; la normalización de nombres se aplica a los valores únicos, no fila a fila."""
+    categorica = serie.astype(str).where(serie.notna()).astype('category')
+    if normalizar:
+        categorias = normalizar_nombre(pd.Series(categorica.cat.categories)).to_numpy()
+        valores = np.where(categorica.cat.codes.to_numpy() >= 0, categorias[categorica.cat.codes.to_numpy()], None)
+        categorica = pd.Series(valores, index=serie.index).astype('category')
+    return categorica
+
+
+def leer_proyectos_tipados(ruta, esquema=ESQUEMA_PROYECTOS):
+    """Tabla de proyectos con tipos compactos y el reporte de filas inválidas."""
+    crudo = leer_fuente(ruta, set(esquema))
+    faltantes = [c for c, (_, obligatoria) in esquema.items() if obligatoria and c not in crudo.columns]
+    if faltantes:
+        raise ErrorEsquema(f"{ruta}: faltan columnas obligatorias {faltantes}")
+
+    df = pd.DataFrame(index=crudo.index)
+    descartar = pd.Series(False, index=crudo.index)
+    problemas = []
+    for columna, (tipo, obligatoria) in esquema.items():
+        if columna not in crudo.columns:
+            df[columna] = pd.Series(None, index=crudo.index, dtype=object)
+            continue
+        serie, invalidos = _convertir(crudo[columna], tipo)
+        faltan = serie.isna() & ~invalidos
+        if obligatoria:
+            motivos = [(invalidos, f"valor no válido para {tipo}"), (faltan, "valor obligatorio vacío")]
+        elif tipo in TIPOS_ENTEROS:
+            # Los enteros opcionales vacíos o inválidos se guardan como 0 (ver abajo)
+            motivos = [(invalidos, f"valor no válido para {tipo}; se usa 0"), (faltan, "valor vacío; se usa 0")]
+        else:
+            motivos = [(invalidos, f"valor no válido para {tipo}")]
+        for mascara, motivo in motivos:
+            if mascara.any():
+                problemas.append(pd.DataFrame({
+                    'fila': crudo.index[mascara],
+                    'ID': _como_texto(crudo.loc[mascara, 'ID']) if 'ID' in crudo.columns else None,
+                    'columna': columna,
+                    'valor': _como_texto(crudo.loc[mascara, columna]),
+                    'motivo': motivo,
+                    'descartada': obligatoria
+                }))
+        if obligatoria:
+            descartar |= invalidos | faltan
+        df[columna] = serie
+
+    df = df[~descartar].reset_index(drop=True)
+    for columna, (tipo, _) in esquema.items():
+        if tipo in TIPOS_ENTEROS:
+            # Opcionales vacíos o inválidos cuentan como 0 (reportados) para poder usar enteros sin NaN
+            df[columna] = df[columna].fillna(0).astype(tipo)
+        elif tipo in ('float32', 'float64'):
+            df[columna] = df[columna].astype(tipo)
+        elif tipo in ('categoria', 'nombre'):
+            df[columna] = _categoria(df[columna], normalizar=tipo == 'nombre')
+
+    if not problemas:
+        return df, pd.DataFrame({c: pd.Series(dtype=object) for c in COLUMNAS_REPORTE})
+    reporte = pd.concat(problemas, ignore_index=True)[COLUMNAS_REPORTE]
+    return df, reporte.sort_values('fila', kind='stable').reset_index(drop=True)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Latencia de los callbacks por etapa, tamaño de las respuestas y aciertos de cache,
+expuestos en formato de texto de Prometheus
+
+Cada proceso lleva sus propios contadores: con varios workers de gunicorn cada scrape
+responde uno de ellos, y la etiqueta `worker` (pid) evita que se mezclen sus series.
+"""
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import flask
+from dash.exceptions import PreventUpdate
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_BYTES = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+RUTA_CALLBACKS = '_dash-update-component'
+
+
+def _etiquetas(nombres, valores):
+    def escapar(valor):
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{n}="{escapar(v)}"' for n, v in zip(nombres, valores))
+
+
+class Histograma:
+    """Histograma acumulado por combinación de etiquetas (buckets fijos, suma y conteo)."""
+
+    def __init__(self, nombre, ayuda, etiquetas, buckets):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = buckets
+        self._series = {}
+
+    def observar(self, valores, valor):
+        serie = self._series.setdefault(tuple(valores), [[0] * len(self.buckets), 0.0, 0])
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                serie[0][i] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+    def exportar(self, fijas):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for valores, (conteos, suma, total) in sorted(self._series.items()):
+            base = _etiquetas(self.etiquetas + fijas[0], valores + fijas[1])
+            for limite, conteo in zip(self.buckets, conteos):
+                lineas.append(f'{self.nombre}_bucket{{{base},le="{limite:g}"}} {conteo}')
+            lineas.append(f'{self.nombre}_bucket{{{base},le="+Inf"}} {total}')
+            lineas.append(f"{self.nombre}_sum{{{base}}} {suma:.6f}")
+            lineas.append(f"{self.nombre}_count{{{base}}} {total}")
+        return lineas
+
+
+class Metricas:
+    """Registro de mediciones de los callbacks del servidor.
+
+    `medir` envuelve un callback y `etapa` cronometra un tramo dentro de él (filtro, cruce,
+    figura...). La serialización de Dash ocurre después de que el callback retorna, así que
+    se mide en `after_request` como el resto de la petición, junto con el tamaño de la respuesta.
+    """
+
+    def __init__(self, log_estructurado=False):
+        self.log_estructurado = log_estructurado
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._caches = {}
+        self._resultados = {}
+        self.duracion = Histograma(
+            'aip_callback_duracion_segundos', "Duración de la petición de callback, de extremo a extremo",
+            ('callback',), BUCKETS_SEGUNDOS
+        )
+        self.etapas = Histograma(
+            'aip_callback_etapa_segundos', "Duración de cada etapa de un callback",
+            ('callback', 'etapa'), BUCKETS_SEGUNDOS
+        )
+        self.respuesta = Histograma(
+            'aip_callback_respuesta_bytes', "Tamaño del cuerpo de la respuesta del callback",
+            ('callback',), BUCKETS_BYTES
+        )
+
+    def registrar_cache(self, nombre, cache):
+        """Cualquier objeto con `estadisticas()` que incluya 'aciertos', 'fallos' y 'entradas'."""
+        self._caches[nombre] = cache
+
+    def instalar(self, server):
+        server.before_request(self._inicio_peticion)
+        server.after_request(self._fin_peticion)
+        server.teardown_request(self._cierre_peticion)
+
+    def medir(self, funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            medicion = getattr(self._local, 'medicion', None)
+            if medicion is None:
+                # Llamada directa (fuera de una petición de Dash): no se registra
+                return funcion(*args, **kwargs)
+            medicion['callback'] = funcion.__name__
+            inicio = time.perf_counter()
+            try:
+                resultado = funcion(*args, **kwargs)
+            except PreventUpdate:
+                medicion['resultado'] = 'sin_cambios'
+                raise
+            except Exception:
+                medicion['resultado'] = 'error'
+                raise
+            finally:
+                medicion['callback_segundos'] = time.perf_counter() - inicio
+            medicion['resultado'] = 'ok'
+            return resultado
+        return envoltura
+
+    @contextmanager
+    def etapa(self, nombre):
+        medicion = getattr(self._local, 'medicion', None)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            if medicion is not None:
+                etapas = medicion['etapas']
+                etapas[nombre] = etapas.get(nombre, 0.0) + time.perf_counter() - inicio
+
+    def _inicio_peticion(self):
+        if flask.request.path.endswith(RUTA_CALLBACKS):
+            self._local.medicion = {'inicio': time.perf_counter(), 'etapas': {}}
+        else:
+            self._local.medicion = None
+
+    def _fin_peticion(self, respuesta):
+        medicion = getattr(self._local, 'medicion', None)
+        self._local.medicion = None
+        if medicion is not None and 'callback' in medicion:
+            self._registrar(medicion, 0 if respuesta.direct_passthrough else len(respuesta.get_data()))
+        return respuesta
+
+    def _cierre_peticion(self, excepcion):
+        # Una excepción no controlada se salta after_request: la petición se cuenta aquí
+        medicion = getattr(self._local, 'medicion', None)
+        self._local.medicion = None
+        if medicion is not None and 'callback' in medicion:
+            self._registrar(medicion, 0)
+
+    def _registrar(self, medicion, tamano):
+        total = time.perf_counter() - medicion['inicio']
+        etapas = dict(medicion['etapas'])
+        # Lo que queda fuera del callback es sobre todo la serialización JSON de la salida
+        etapas['serializacion'] = etapas.get('serializacion', 0.0) + max(total - medicion['callback_segundos'], 0.0)
+        nombre = medicion['callback']
+        with self._lock:
+            self.duracion.observar((nombre,), total)
+            for etapa, segundos in etapas.items():
+                self.etapas.observar((nombre, etapa), segundos)
+            self.respuesta.observar((nombre,), tamano)
+            clave = (nombre, medicion['resultado'])
+            self._resultados[clave] = self._resultados.get(clave, 0) + 1
+
+        if self.log_estructurado:
+            logger.info(json.dumps({
+                'callback': nombre,
+                'resultado': medicion['resultado'],
+                'duracion_ms': round(total * 1000, 3),
+                'etapas_ms': {e: round(s * 1000, 3) for e, s in etapas.items()},
+                'bytes': tamano,
+                'worker': os.getpid()
+            }))
+
+    def exportar(self):
+        """Texto de exposición de Prometheus (versión 0.0.4)."""
+        fijas = (('worker',), (os.getpid(),))
+        with self._lock:
+            lineas = []
+            for histograma in (self.duracion, self.etapas, self.respuesta):
+                lineas += histograma.exportar(fijas)
+            lineas += [
+                "# HELP aip_callback_llamadas_total Peticiones de callback por resultado",
+                "# TYPE aip_callback_llamadas_total counter"
+            ]
+            for (nombre, resultado), total in sorted(self._resultados.items()):
+                base = _etiquetas(('callback', 'resultado') + fijas[0], (nombre, resultado) + fijas[1])
+                lineas.append(f"aip_callback_llamadas_total{{{base}}} {total}")
+
+        estadisticas = {nombre: cache.estadisticas() for nombre, cache in self._caches.items()}
+        for metrica, tipo, ayuda, valor in [
+            ('aip_cache_aciertos_total', 'counter', "Aciertos de la cache", lambda e: e['aciertos']),
+            ('aip_cache_fallos_total', 'counter', "Fallos de la cache", lambda e: e['fallos']),
+            ('aip_cache_tasa_aciertos', 'gauge', "Aciertos / consultas desde el arranque",
+             lambda e: e['aciertos'] / (e['aciertos'] + e['fallos']) if e['aciertos'] + e['fallos'] else 0.0),
+            ('aip_cache_entradas', 'gauge', "Entradas guardadas", lambda e: e['entradas'])
+        ]:
+            lineas += [f"# HELP {metrica} {ayuda}", f"# TYPE {metrica} {tipo}"]
+            for nombre, datos in sorted(estadisticas.items()):
+                base = _etiquetas(('cache',) + fijas[0], (nombre,) + fijas[1])
+                lineas.append(f"{metrica}{{{base}}} {valor(datos)}")
+        return '\n'.join(lineas) + '\n'
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Nomenclátor de municipios: atributos geométricos vectorizados e índice por nombre normalizado
+"""
+
+import difflib
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Sistema plano (MAGNA-SIRGAS / Colombia Bogotá) para centroides y áreas
+CRS_PLANO = "EPSG:3116"
+
+COLUMNAS_GEOMETRICAS = ['lon', 'lat', 'minx', 'miny', 'maxx', 'maxy', 'area_ha']
+
+
+def normalizar_nombre(serie):
+    """Mayúsculas y espacios colapsados, como se muestran en el dashboard."""
+    return serie.str.upper().str.strip().str.replace(r'\s+', ' ', regex=True)
+
+
+def plegar_nombre(texto):
+    """Alias sin tildes ni puntuación: 'SAN ANDRÉS DE TUMACO.' -> 'SAN ANDRES DE TUMACO'."""
+    texto = unicodedata.normalize('NFKD', str(texto).upper())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', re.sub(r'[^A-Z0-9 ]', ' ', texto)).strip()
+
+
+def atributos_geometricos(gdf):
+    """Centroide (lon/lat en EPSG:4326), bbox y área en hectáreas, sin lambdas por fila."""
+    proyectado = gdf.geometry.to_crs(CRS_PLANO)
+    centroides = proyectado.centroid.to_crs(gdf.crs)
+    limites = gdf.geometry.bounds
+    return pd.DataFrame({
+        'lon': centroides.x.to_numpy(),
+        'lat': centroides.y.to_numpy(),
+        'minx': limites['minx'].to_numpy(),
+        'miny': limites['miny'].to_numpy(),
+        'maxx': limites['maxx'].to_numpy(),
+        'maxy': limites['maxy'].to_numpy(),
+        'area_ha': proyectado.area.to_numpy() / 10000
+    }, index=gdf.index)
+
+
+class Nomenclator:
+    """Arreglos NumPy por municipio e índice (municipio, departamento) -> posición de fila."""
+
+    def __init__(self, gdf, columna_municipio='MpNombre', columna_departamento='Depto', columna_codigo='codigo'):
+        self.nombres = gdf[columna_municipio].to_numpy()
+        self.departamentos = gdf[columna_departamento].to_numpy()
+        self.codigos = gdf[columna_codigo].to_numpy()
+        for columna in COLUMNAS_GEOMETRICAS:
+            setattr(self, columna, gdf[columna].to_numpy(dtype=float))
+
+        self.indice = {}
+        alias = {}
+        for posicion, clave in enumerate(zip(self.nombres, self.departamentos)):
+            self.indice.setdefault(clave, posicion)
+            alias.setdefault(tuple(plegar_nombre(v) for v in clave), set()).add(posicion)
+
+        # Los alias ambiguos (dos municipios que se pliegan igual) no se indexan
+        self.alias = {clave: posiciones.pop() for clave, posiciones in alias.items() if len(posiciones) == 1}
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def buscar(self, municipio, departamento):
+        """Posición de fila del municipio, o -1 si no se encuentra."""
+        posicion = self.indice.get((municipio, departamento))
+        if posicion is None:
+            posicion = self.alias.get((plegar_nombre(municipio), plegar_nombre(departamento)), -1)
+        return posicion
+
+    def posiciones(self, municipios, departamentos):
+        """`buscar` sobre dos columnas alineadas; devuelve un arreglo de enteros."""
+        return np.fromiter(
+            (self.buscar(m, d) for m, d in zip(municipios, departamentos)),
+            dtype=np.int64,
+            count=len(municipios)
+        )
+
+    def sugerencia(self, municipio, departamento):
+        """Nombre más parecido del mismo departamento, para el reporte de no emparejados."""
+        plegado = plegar_nombre(departamento)
+        candidatos = [n for n, d in zip(self.nombres, self.departamentos) if plegar_nombre(d) == plegado]
+        parecidos = difflib.get_close_matches(str(municipio), candidatos or list(self.nombres), n=1)
+        return parecidos[0] if parecidos else None
+
+    def reporte_sin_emparejar(self, df, posiciones, columnas=('ID', 'Municipio', 'Departamento')):
+        """Filas de `df` sin municipio en el shapefile (no aparecen en el mapa)."""
+        reporte = df.loc[posiciones < 0, list(columnas)].copy()
+        reporte['Sugerencia'] = [
+            self.sugerencia(m, d) for m, d in zip(reporte['Municipio'], reporte['Departamento'])
+        ]
+        return reporte
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Recarga en caliente de proyectos.xlsx: vigilancia del archivo en un hilo de fondo y
+reemplazo atómico de la instantánea de datos vigente
+"""
+
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from datos import hash_archivo
+
+logger = logging.getLogger(__name__)
+
+
+def diferencias_por_id(anterior, nuevo, columna='ID'):
+    """IDs agregados, eliminados y modificados entre dos versiones de la tabla de proyectos."""
+    def hashes(df):
+        columnas = [c for c in df.columns if c != columna]
+        filas = pd.util.hash_pandas_object(df[columnas], index=False)
+        # IDs repetidos: se combinan sus filas en un solo hash
+        return pd.Series(filas.to_numpy(), index=df[columna].to_numpy()).groupby(level=0).sum()
+
+    previos = hashes(anterior[anterior.columns.intersection(nuevo.columns)])
+    actuales = hashes(nuevo[nuevo.columns.intersection(anterior.columns)])
+    comunes = previos.index.intersection(actuales.index)
+    return {
+        'agregados': actuales.index.difference(previos.index).tolist(),
+        'eliminados': previos.index.difference(actuales.index).tolist(),
+        'modificados': comunes[previos[comunes].to_numpy() != actuales[comunes].to_numpy()].tolist()
+    }
+
+
+class RecargaDatos:
+    """Mantiene en `actual` la instantánea construida por `construir(version, anterior)` desde `ruta`.
+
+    Un hilo revisa cada `intervalo` segundos el tamaño y mtime del archivo; si cambian y el
+    contenido (sha1) es otro, construye la nueva instantánea fuera del camino de las
+    peticiones y la publica con una sola asignación. Los callbacks leen `actual` una vez y
+    trabajan con esa referencia, así nunca mezclan tablas e índices de versiones distintas.
+    """
+
+    def __init__(self, ruta, construir, intervalo=30, al_publicar=None):
+        self.ruta = ruta
+        self.construir = construir
+        self.intervalo = intervalo
+        self.al_publicar = al_publicar
+        self._lock = threading.Lock()
+        # verificar() también se llama desde peticiones: una sola construcción a la vez
+        self._lock_verificar = threading.Lock()
+        self._pid = None
+        self.recargas = 0
+        self.errores = 0
+        self.ultimo_cambio = None
+
+        self._firma = self._firma_archivo()
+        self.actual = construir(hash_archivo(ruta), None)
+
+    def _firma_archivo(self):
+        estado = os.stat(self.ruta)
+        return (estado.st_mtime_ns, estado.st_size)
+
+    def iniciar(self):
+        """Arranca el hilo de vigilancia en este proceso (los workers de gunicorn no heredan hilos)."""
+        if self.intervalo <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._vigilar, name='recarga-datos', daemon=True).start()
+
+    def _vigilar(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.verificar()
+            except Exception:
+                # Un archivo a medio escribir o inválido no tumba el hilo: se reintenta en el próximo ciclo
+                self.errores += 1
+                logger.exception("No se pudo recargar %s; se mantiene la versión %s", self.ruta, self.actual.version)
+
+    def verificar(self):
+        """Recarga si el archivo cambió; devuelve True si se publicó una nueva instantánea."""
+        with self._lock_verificar:
+            return self._verificar()
+
+    def _verificar(self):
+        firma = self._firma_archivo()
+        if firma == self._firma:
+            return False
+        version = hash_archivo(self.ruta)
+        if version == self.actual.version:
+            # Mismo contenido (p. ej. `touch`): nada que recargar
+            self._firma = firma
+            return False
+
+        nuevo = self.construir(version, self.actual)
+        cambios = diferencias_por_id(self.actual.df, nuevo.df)
+        self._firma = firma
+        if not any(cambios.values()):
+            # Solo cambió el formato del Excel: se conserva la instantánea y sus caches
+            return False
+
+        self.actual = nuevo
+        self.recargas += 1
+        self.ultimo_cambio = {
+            'version': version,
+            'fecha': nuevo.fecha.isoformat(),
+            **{tipo: len(ids) for tipo, ids in cambios.items()}
+        }
+        logger.info(
+            "Datos recargados (%s): %d agregados, %d eliminados, %d modificados",
+            version[:12], len(cambios['agregados']), len(cambios['eliminados']), len(cambios['modificados'])
+        )
+        if self.al_publicar is not None:
+            self.al_publicar(nuevo)
+        return True
+
+    def estadisticas(self):
+        return {
+            'version': self.actual.version,
+            'fecha': self.actual.fecha.isoformat(),
+            'proyectos': len(self.actual.df),
+            'intervalo': self.intervalo,
+            'recargas': self.recargas,
+            'errores': self.errores,
+            'ultimo_cambio': self.ultimo_cambio
+        }
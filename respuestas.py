@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Compresión de las respuestas del servidor y cabeceras de cache de los assets
+
+gzip siempre (zlib de la biblioteca estándar); brotli si está instalado el paquete `brotli`
+y el navegador lo acepta. Los assets se referencian con la huella de su contenido en la
+URL (?v=<hash>), así que se pueden cachear indefinidamente.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import flask
+
+try:
+    import brotli
+except ImportError:  # Sin brotli se comprime solo con gzip
+    brotli = None
+
+# Tipos que vale la pena comprimir (JSON de callbacks, layout, HTML, JS, GeoJSON...)
+TIPOS_COMPRIMIBLES = (
+    'application/json', 'application/geo+json', 'application/javascript', 'text/'
+)
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def huella_archivo(ruta):
+    sha1 = hashlib.sha1()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 16), b''):
+            sha1.update(bloque)
+    return sha1.hexdigest()[:12]
+
+
+def url_asset(app, nombre):
+    """URL del asset con la huella de su contenido, o None si el archivo no existe."""
+    ruta = os.path.join(app.config.assets_folder, nombre)
+    if not os.path.exists(ruta):
+        return None
+    return f"{app.get_asset_url(nombre)}?v={huella_archivo(ruta)}"
+
+
+class CompresionRespuestas:
+    """Comprime en `after_request` las respuestas de texto/JSON de más de `umbral` bytes.
+
+    Las respuestas con ETag (p. ej. el GeoJSON publicado) se comprimen una sola vez y se
+    guardan por (ETag, codificación); el resto, como los callbacks, se comprime en cada
+    petición.
+    """
+
+    def __init__(self, umbral=1024, nivel_gzip=6, nivel_brotli=5, max_guardadas=32):
+        self.umbral = umbral
+        self.nivel_gzip = nivel_gzip
+        self.nivel_brotli = nivel_brotli
+        self.max_guardadas = max_guardadas
+        self._guardadas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def instalar(self, server):
+        server.after_request(self.comprimir)
+
+    def _codificacion(self):
+        aceptadas = flask.request.accept_encodings
+        if brotli is not None and aceptadas['br']:
+            return 'br'
+        if aceptadas['gzip']:
+            return 'gzip'
+        return None
+
+    def _codificar(self, datos, codificacion):
+        if codificacion == 'br':
+            return brotli.compress(datos, quality=self.nivel_brotli)
+        # mtime=0: misma entrada, mismos bytes
+        return gzip.compress(datos, compresslevel=self.nivel_gzip, mtime=0)
+
+    def comprimir(self, respuesta):
+        if (respuesta.status_code != 200 or respuesta.direct_passthrough or respuesta.is_streamed
+                or 'Content-Encoding' in respuesta.headers
+                or not respuesta.mimetype.startswith(TIPOS_COMPRIMIBLES)):
+            return respuesta
+        respuesta.vary.add('Accept-Encoding')
+        codificacion = self._codificacion()
+        if codificacion is None or len(respuesta.get_data()) < self.umbral:
+            return respuesta
+
+        etag, _ = respuesta.get_etag()
+        if etag is None:
+            datos = self._codificar(respuesta.get_data(), codificacion)
+        else:
+            with self._lock:
+                datos = self._guardadas.get((etag, codificacion))
+            if datos is None:
+                datos = self._codificar(respuesta.get_data(), codificacion)
+                with self._lock:
+                    self._guardadas[(etag, codificacion)] = datos
+                    while len(self._guardadas) > self.max_guardadas:
+                        self._guardadas.popitem(last=False)
+            # Otro cuerpo para la misma representación: el ETag pasa a ser débil
+            respuesta.set_etag(etag, weak=True)
+
+        respuesta.set_data(datos)
+        respuesta.headers['Content-Encoding'] = codificacion
+        return respuesta
+
+
+def instalar_cache_assets(server, prefijo='/assets/'):
+    """Cache-Control inmutable para los assets pedidos con huella (?v= propio, ?m= de Dash)."""
+    def cabeceras(respuesta):
+        peticion = flask.request
+        if peticion.path.startswith(prefijo) and ('v' in peticion.args or 'm' in peticion.args) \
+                and respuesta.status_code in (200, 304):
+            respuesta.headers['Cache-Control'] = CACHE_INMUTABLE
+        return respuesta
+    server.after_request(cabeceras)